@@ -1,13 +1,30 @@
-from flask import Flask, request, jsonify, send_from_directory
+import time
+# Measured before the other imports, so boot timing includes them.
+BOOT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, send_from_directory
 import random, string, time, json
+import threading
+import heapq
+import itertools
+from contextlib import contextmanager
 import html
-from datetime import datetime
-from copy import deepcopy
+from datetime import date, datetime, timezone
+import atexit
+from collections import OrderedDict
 import os
+import sys
+from array import array
 import hashlib
+import marshal
+import math
+import sqlite3
 from typing import Optional
 import uuid
 
+from shard_router import shard_for
+from songset_compiler import CompiledCatalog, check_song, songset_paths
+
 # Optional Postgres persistence (game runs fine without it)
 try:
     import psycopg2
@@ -15,10 +32,207 @@ try:
 except Exception:
     psycopg2 = None
 
+# Startup timing (from BOOT_STARTED at the top), reported at boot and under `boot` on /stats.
+BOOT_STATS = {"ready_ms": None, "first_request_ms": None, "db_ready_ms": None}
+
 app = Flask(__name__, static_folder="web", static_url_path="")
 PORT = 8787
 VERSION = "v1.4.45-github-ready"
-rooms = {}
+
+# -----------------------------
+# Room store
+# -----------------------------
+
+class MemoryRoomStore(dict):
+    """Rooms in this process' memory (the default; one worker only)."""
+    shared = False
+    # SSE listeners are woken by touch_room(), no need to poll.
+    poll_interval = None
+
+    def __init__(self):
+        super().__init__()
+        # code -> last action/poll (epoch seconds), for the room reaper
+        self.last_seen = {}
+
+    def add(self, code: str, room: dict) -> bool:
+        if code in self:
+            return False
+        self[code] = room
+        self.last_seen[code] = time.time()
+        return True
+
+    def pop(self, code, default=None):
+        self.last_seen.pop(code, None)
+        return super().pop(code, default)
+
+    def mark_seen(self, code: str):
+        self.last_seen[code] = time.time()
+
+    def seen_at(self, code: str) -> float:
+        return self.last_seen.get(code, 0.0)
+
+    def idle_order(self) -> list:
+        """[(code, last_seen)], least recently used first."""
+        return sorted(((c, self.last_seen.get(c, 0.0)) for c in list(self.keys())), key=lambda x: x[1])
+
+    def version(self, code: str):
+        room = self.get(code)
+        return room.get("version") if room else None
+
+    def commit(self, code: str, room: dict, loaded_version) -> bool:
+        # The room object *is* the stored state.
+        return True
+
+
+class SqliteRoomStore:
+    """Rooms shared by every worker process on this machine (SQLite in WAL mode).
+
+    Each action loads the room, mutates its own copy and writes it back with a
+    compare-and-swap on the room version; on a conflict api() re-runs the action.
+    """
+    shared = True
+    # Mutations in other workers don't wake our SSE listeners; re-check this often.
+    poll_interval = 0.5
+    # Polls don't change the room, so only refresh updated_at this often per room.
+    seen_write_interval = 30
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._seen_written = {}
+        with self._conn() as c:
+            c.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rooms (
+                    code TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    data TEXT NOT NULL
+                );
+                """
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=10)
+            c.execute("PRAGMA journal_mode=WAL;")
+            c.execute("PRAGMA synchronous=NORMAL;")
+            self._local.conn = c
+        return c
+
+    def get(self, code, default=None):
+        row = self._conn().execute("SELECT data FROM rooms WHERE code = ?;", (code,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __contains__(self, code) -> bool:
+        return self._conn().execute("SELECT 1 FROM rooms WHERE code = ?;", (code,)).fetchone() is not None
+
+    def version(self, code: str):
+        """The room's version without loading it (None if it doesn't exist)."""
+        row = self._conn().execute("SELECT version FROM rooms WHERE code = ?;", (code,)).fetchone()
+        return row[0] if row else None
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM rooms;").fetchone()[0]
+
+    def items(self):
+        return [(code, json.loads(data)) for code, data in self._conn().execute("SELECT code, data FROM rooms;")]
+
+    def add(self, code: str, room: dict) -> bool:
+        try:
+            with self._conn() as c:
+                c.execute(
+                    "INSERT INTO rooms (code, version, updated_at, data) VALUES (?, ?, ?, ?);",
+                    (code, int(room.get("version") or 0), time.time(), json.dumps(room)),
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def pop(self, code, default=None):
+        self._seen_written.pop(code, None)
+        with self._conn() as c:
+            c.execute("DELETE FROM rooms WHERE code = ?;", (code,))
+        return default
+
+    def mark_seen(self, code: str):
+        t = time.time()
+        if t - self._seen_written.get(code, 0.0) < self.seen_write_interval:
+            return
+        self._seen_written[code] = t
+        with self._conn() as c:
+            c.execute("UPDATE rooms SET updated_at = ? WHERE code = ?;", (t, code))
+
+    def seen_at(self, code: str) -> float:
+        row = self._conn().execute("SELECT updated_at FROM rooms WHERE code = ?;", (code,)).fetchone()
+        return float(row[0]) if row else 0.0
+
+    def idle_order(self) -> list:
+        """[(code, updated_at)], least recently used first."""
+        return list(self._conn().execute("SELECT code, updated_at FROM rooms ORDER BY updated_at;"))
+
+    def commit(self, code: str, room: dict, loaded_version) -> bool:
+        """Write back a mutated room; False if another worker changed it meanwhile."""
+        if room.get("version") == loaded_version:
+            return True
+        with self._conn() as c:
+            cur = c.execute(
+                "UPDATE rooms SET version = ?, updated_at = ?, data = ? WHERE code = ? AND version = ?;",
+                (int(room.get("version") or 0), time.time(), json.dumps(room), code, int(loaded_version or 0)),
+            )
+            if cur.rowcount == 1:
+                return True
+            # Nothing to write if the room was deleted (e.g. the last player left).
+            return c.execute("SELECT 1 FROM rooms WHERE code = ?;", (code,)).fetchone() is None
+
+
+def make_room_store(url: str):
+    """ROOM_STORE=sqlite:///path/rooms.db shares rooms between gunicorn workers."""
+    if url.startswith("sqlite:///"):
+        return SqliteRoomStore(url[len("sqlite:///"):])
+    return MemoryRoomStore()
+
+
+# Room-code sharding (see shard_router.py): this worker owns codes with shard_for(code) == SHARD_INDEX.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1") or 1)
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0") or 0)
+
+ROOM_STORE_URL = os.getenv("ROOM_STORE", "").strip()
+ROOM_STORE_RETRIES = 5
+rooms = make_room_store(ROOM_STORE_URL)
+
+# Room reaper: evict rooms idle (no action, poll or open SSE stream) for ROOM_TTL_SECONDS,
+# then the least recently used ones beyond ROOM_MAX_COUNT / ROOM_MAX_MB (serialized size).
+ROOM_TTL_SECONDS = int(os.getenv("ROOM_TTL_SECONDS", str(3 * 3600)) or 0)
+ROOM_MAX_COUNT = int(os.getenv("ROOM_MAX_COUNT", "10000") or 0)
+ROOM_MAX_MB = float(os.getenv("ROOM_MAX_MB", "200") or 0)
+ROOM_REAPER_INTERVAL = int(os.getenv("ROOM_REAPER_INTERVAL", "60") or 0)
+# Players who left and may re-join; older entries are dropped beyond this.
+LEFT_PLAYERS_MAX = 50
+# The raw room (`full` on `state` and the SSE stream) includes the current song, device
+# ids and guesses, so it is only served when this is set (debugging).
+ROOM_DEBUG_VIEWS = os.getenv("ROOM_DEBUG_VIEWS", "").strip().lower() in {"1", "true", "yes"}
+REAPER_STATS = {
+    "runs": 0,
+    "last_run_at": None,
+    "rooms_evicted": 0,
+    "bytes_reclaimed": 0,
+}
+
+# Locking model:
+# - ROOMS_LOCK guards the registry itself (adding/removing rooms and their conditions).
+# - Every room has its own Condition over an RLock. Holding it serializes all mutations of
+#   that room while other rooms stay independent; SSE listeners wait on it for touch_room().
+# Lock order is always room lock -> ROOMS_LOCK, never the other way round.
+# With a shared store these locks only cover this process; workers are kept consistent
+# by the store's optimistic versioning (see SqliteRoomStore.commit).
+ROOMS_LOCK = threading.RLock()
+_room_conditions = {}
+SSE_KEEPALIVE_SECONDS = 15
+
+# Encoded state snapshots shared by all pollers of a room: code -> (version, {view: bytes}).
+_room_snapshots = {}
 
 
 def _norm_name(name: str) -> str:
@@ -27,7 +241,7 @@ def _norm_name(name: str) -> str:
 # Simple in-memory statistics (reset on deploy/restart)
 STATS = {
     "visits": 0,
-    "unique_devices": set(),   # device_id values we've seen
+    "unique_devices": None,    # HyperLogLog of device_ids seen (created with the class below)
     "rooms_created": 0,
     "games_completed": 0,
 }
@@ -38,7 +252,7 @@ STATS = {
 
 DB_URL = os.getenv("DATABASE_URL") or os.getenv("INTERNAL_DATABASE_URL")
 DB_DISABLED = os.getenv("DISABLE_DB", "").strip().lower() in {"1", "true", "yes"}
-DB_AVAILABLE = bool(DB_URL) and not DB_DISABLED and psycopg2 is not None
+DB_AVAILABLE = bool(DB_URL) and not DB_DISABLED and (psycopg2 is not None or DB_URL.startswith("sqlite:///"))
 
 def _hash_device(device_id: str) -> str:
     """Store only a one-way hash of device id in the database (privacy)."""
@@ -47,9 +261,431 @@ def _hash_device(device_id: str) -> str:
     return hashlib.sha256(device_id.encode("utf-8")).hexdigest()
 
 
+def player_names(players) -> list:
+    """Display names from a stored players value.
+
+    Players may be a list of dicts (e.g. {"name": "..."}), a list of strings, a single
+    dict or an already joined string in older records.
+    """
+    names = []
+    if isinstance(players, list):
+        for p in players:
+            if isinstance(p, str):
+                names.append(p)
+            elif isinstance(p, dict):
+                n = p.get("name") or p.get("player") or p.get("username") or p.get("display_name") or p.get("id")
+                if n is not None:
+                    names.append(str(n))
+            elif p is not None:
+                names.append(str(p))
+    elif isinstance(players, dict):
+        n = players.get("name") or players.get("player") or players.get("username") or players.get("display_name") or players.get("id")
+        if n is not None:
+            names.append(str(n))
+    elif isinstance(players, str) and players.strip():
+        names = [s.strip() for s in players.split(",") if s.strip()]
+    return [n for n in names if n]
+
+
+# daily_metrics counters are buffered in memory and flushed this often (seconds)
+METRIC_FIELDS = ("visits", "rooms_created", "games_completed")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5") or 5)
+
+# How long /admin/api/summary may serve cached dashboard numbers (seconds)
+ADMIN_SUMMARY_TTL = float(os.getenv("ADMIN_SUMMARY_TTL", "30") or 30)
+
+# Connection pool sizing (per process)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1") or 1)
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10") or 10)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5") or 5)
+# Idle connections older than this get a `SELECT 1` before they are handed out.
+DB_POOL_CHECK_AFTER = float(os.getenv("DB_POOL_CHECK_AFTER", "30") or 30)
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5") or 5)
+
+# Circuit breaker: after DB_BREAKER_FAILURES failed (or slower than DB_BREAKER_SLOW_SECONDS)
+# calls in a row the DB is skipped, and probed again every DB_BREAKER_COOLDOWN seconds.
+DB_BREAKER_FAILURES = int(os.getenv("DB_BREAKER_FAILURES", "3") or 3)
+DB_BREAKER_SLOW_SECONDS = float(os.getenv("DB_BREAKER_SLOW_SECONDS", "2") or 2)
+DB_BREAKER_COOLDOWN = float(os.getenv("DB_BREAKER_COOLDOWN", "15") or 15)
+# Devices seen while the DB is down, written when it is back (beyond this they are dropped).
+DB_PENDING_DEVICES_MAX = 50000
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class DbUnavailable(Exception):
+    """Raised instead of calling the DB while the circuit breaker is open."""
+
+
+def is_db_error(e: BaseException) -> bool:
+    """Whether an error means the database is unreachable or failing (connection, pool,
+    I/O); bad input (DataError, IntegrityError, ...) and our own bugs don't count."""
+    errors = (sqlite3.OperationalError, PoolTimeout)
+    if psycopg2:
+        errors += (psycopg2.OperationalError, psycopg2.InterfaceError)
+    return isinstance(e, errors)
+
+
+class CircuitBreaker:
+    """Fails DB calls fast (DbUnavailable) after repeated database errors or slow calls,
+    until a background probe succeeds."""
+
+    def __init__(self, failures: int = DB_BREAKER_FAILURES, slow: float = DB_BREAKER_SLOW_SECONDS,
+                 cooldown: float = DB_BREAKER_COOLDOWN):
+        self.failures = max(1, failures)
+        self.slow = slow
+        self.cooldown = cooldown
+        self.state = "closed"  # closed | open | half_open (probe running) | warming
+        self._lock = threading.Lock()
+        self._failed = 0
+        self.opened_at = None
+        self.retry_at = 0.0
+        self.last_error = None
+        self.metrics = {"trips": 0, "short_circuits": 0, "failures": 0, "slow_calls": 0, "probes": 0}
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        with self._lock:
+            self.metrics["short_circuits"] += 1
+        return False
+
+    def call(self, fn, *args, **kwargs):
+        if not self.allow():
+            raise DbUnavailable(self.last_error or "db circuit open")
+        t0 = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_db_error(e):
+                self._record(False, e)
+            raise
+        elapsed = time.monotonic() - t0
+        if elapsed > self.slow:
+            with self._lock:
+                self.metrics["slow_calls"] += 1
+            self._record(False, f"slow call ({elapsed:.1f}s)")
+        else:
+            self._record(True)
+        return result
+
+    def _record(self, ok: bool, error=None):
+        with self._lock:
+            if ok:
+                self._failed = 0
+                return
+            self.metrics["failures"] += 1
+            self._failed += 1
+            self.last_error = str(error)
+            if self.state != "closed" or self._failed < self.failures:
+                return
+        self.trip(error)
+
+    def trip(self, error=None):
+        with self._lock:
+            self.state = "open"
+            self.opened_at = self.opened_at or time.time()
+            self.retry_at = time.monotonic() + self.cooldown
+            self.last_error = str(error) if error is not None else self.last_error
+            self.metrics["trips"] += 1
+        print("DB circuit open:", error)
+
+    def probe(self, fn) -> bool:
+        """Run fn once the cooldown has passed; close the breaker if it succeeds."""
+        with self._lock:
+            if self.state != "open" or time.monotonic() < self.retry_at:
+                return self.state == "closed"
+            self.state = "half_open"
+            self.metrics["probes"] += 1
+        try:
+            fn()
+        except Exception as e:
+            with self._lock:
+                self.state = "open"
+                self.retry_at = time.monotonic() + self.cooldown
+                self.last_error = str(e)
+            return False
+        with self._lock:
+            self.state = "closed"
+            self._failed = 0
+            down_for = time.time() - (self.opened_at or time.time())
+            self.opened_at = None
+        print(f"DB circuit closed (down for {down_for:.0f}s)")
+        return True
+
+    def reset(self):
+        with self._lock:
+            self.state = "closed"
+            self._failed = 0
+            self.opened_at = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.metrics, state=self.state, last_error=self.last_error,
+                        open_since=int(self.opened_at) if self.opened_at else None)
+
+
+class PgPool:
+    """Bounded, thread-safe pool of psycopg2 connections.
+
+    Connections are health-checked when they have been idle for a while and thrown
+    away (and transparently replaced) when they break.
+    """
+
+    def __init__(self, url: str, minconn: int = 1, maxconn: int = 10, timeout: float = 5.0):
+        self.url = url
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.timeout = timeout
+        self._idle = []   # [(connection, returned_at)]
+        self._size = 0    # open connections (idle + checked out)
+        self._cond = threading.Condition()
+        self.metrics = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "timeouts": 0,
+            "connects": 0,
+            "health_check_failures": 0,
+            "errors": 0,
+            "discarded": 0,
+        }
+
+    def _connect(self):
+        c = psycopg2.connect(self.url, sslmode=os.getenv("PGSSLMODE", "prefer"), connect_timeout=DB_CONNECT_TIMEOUT)
+        with self._cond:
+            self.metrics["connects"] += 1
+        return c
+
+    def prefill(self):
+        while True:
+            with self._cond:
+                if self._size >= self.minconn:
+                    return
+                self._size += 1
+            try:
+                c = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            self._put_back(c)
+
+    def _put_back(self, c):
+        with self._cond:
+            self._idle.append((c, time.time()))
+            self._cond.notify()
+
+    def _discard(self, c):
+        try:
+            c.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self.metrics["discarded"] += 1
+            self._cond.notify()
+
+    def _healthy(self, c, idle_since: float) -> bool:
+        if c.closed:
+            return False
+        if time.time() - idle_since < DB_POOL_CHECK_AFTER:
+            return True
+        try:
+            with c.cursor() as cur:
+                cur.execute("SELECT 1;")
+            c.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self.metrics["health_check_failures"] += 1
+            return False
+
+    def _checkout(self):
+        deadline = time.time() + self.timeout
+        waited = False
+        started = time.time()
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.metrics["timeouts"] += 1
+                        raise PoolTimeout("no database connection available")
+                    waited = True
+                    self._cond.wait(timeout=remaining)
+                if waited:
+                    self.metrics["waits"] += 1
+                    self.metrics["wait_seconds"] += time.time() - started
+                    waited = False
+                self.metrics["checkouts"] += 1
+                if self._idle:
+                    c, idle_since = self._idle.pop()
+                else:
+                    c, idle_since = None, None
+                    self._size += 1
+            if c is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self.metrics["errors"] += 1
+                        self._cond.notify()
+                    raise
+            if self._healthy(c, idle_since):
+                return c
+            # Dead connection: drop it and try again (reconnects if needed)
+            self._discard(c)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success, rolls back (or discards) on error."""
+        c = self._checkout()
+        try:
+            yield c
+            c.commit()
+        except Exception as e:
+            with self._cond:
+                self.metrics["errors"] += 1
+            broken = c.closed or isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            if not broken:
+                try:
+                    c.rollback()
+                except Exception:
+                    broken = True
+            if broken:
+                self._discard(c)
+                c = None
+            raise
+        finally:
+            if c is not None:
+                self._put_back(c)
+
+    def stats(self) -> dict:
+        with self._cond:
+            out = dict(self.metrics)
+            out.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min": self.minconn,
+                "max": self.maxconn,
+            })
+        out["wait_seconds"] = round(out["wait_seconds"], 3)
+        return out
+
+
+# Devices already written to the `devices` table by this process (see DeviceCache)
+DEVICE_CACHE_SIZE = int(os.getenv("DEVICE_CACHE_SIZE", "100000") or 100000)
+DEVICE_CACHE_TTL = float(os.getenv("DEVICE_CACHE_TTL", "0") or 0)  # seconds; 0 = process lifetime
+
+
+class DeviceCache:
+    """Bounded LRU of device hashes known to be persisted, so each device costs one
+    `devices` upsert per process (or per TTL) instead of one per request."""
+
+    def __init__(self, maxsize: int, ttl: float = 0):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._items = OrderedDict()  # device hash -> time added
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def seen(self, key: str) -> bool:
+        with self._lock:
+            added = self._items.get(key)
+            if added is not None and (not self.ttl or time.time() - added < self.ttl):
+                self._items.move_to_end(key)
+                self.metrics["hits"] += 1
+                return True
+            self.metrics["misses"] += 1
+            return False
+
+    def add(self, key: str):
+        with self._lock:
+            self._items[key] = time.time()
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self.metrics["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.metrics, size=len(self._items), max=self.maxsize)
+
+
+# Unique devices are estimated with HyperLogLog: 2**HLL_PRECISION one-byte registers
+# (16 KB, about 0.8% standard error at 14) instead of a set of every device id.
+HLL_PRECISION = 14
+_HLL_POW = [2.0 ** -i for i in range(66)]
+
+
+class HyperLogLog:
+    """Fixed-size estimator of the number of distinct strings added.
+
+    Sketches with the same precision merge by taking the larger register, so daily
+    sketches from several workers (or several days) combine into one count, and
+    merging the same sketch twice changes nothing.
+    """
+
+    def __init__(self, p: int = HLL_PRECISION, registers: bytes = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers else bytearray(self.m)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(len(data).bit_length() - 1, data)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+    def add(self, item: str):
+        x = int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big")
+        bits = 64 - self.p
+        idx = x >> bits
+        rank = bits - (x & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.m != self.m:
+            raise ValueError("HyperLogLog precision mismatch")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.m
+        est = (0.7213 / (1 + 1.079 / m)) * m * m / sum(_HLL_POW[r] for r in self.registers)
+        zeros = self.registers.count(0)
+        if est <= 2.5 * m and zeros:
+            est = m * math.log(m / zeros)  # small-range correction (linear counting)
+        return int(round(est))
+
+
+STATS["unique_devices"] = HyperLogLog()
+
+
 class Db:
     def __init__(self, url: Optional[str]):
         self.url = url
+        self.pool = PgPool(url, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT) if self.is_enabled() else None
+        self.device_cache = DeviceCache(DEVICE_CACHE_SIZE, DEVICE_CACHE_TTL)
+        # admin_summary() cache: days -> (expires_at, summary)
+        self._summary_cache = {}
+        self._summary_lock = threading.Lock()
+        # Write-behind daily counters: day -> {field: count} not yet in daily_metrics
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        # day -> HyperLogLog of devices not yet merged into device_sketches (same lock)
+        self._sketches = {}
+        self.breaker = CircuitBreaker()
+        # Set once init() has created the tables; until then probe() retries init().
+        self.ready = False
+        # Device ids that couldn't be registered while the DB was down (same lock)
+        self._pending_devices = OrderedDict()
 
     def is_enabled(self) -> bool:
         return bool(self.url) and not DB_DISABLED and psycopg2 is not None
@@ -60,12 +696,16 @@ class Db:
         return self.is_enabled()
 
     def conn(self):
-        # short connections are OK for Render Postgres; keep it simple
-        return psycopg2.connect(self.url, sslmode=os.getenv("PGSSLMODE", "prefer"))
+        """Pooled connection as a context manager: `with self.conn() as c: ...`."""
+        return self.pool.connection()
+
+    def pool_stats(self) -> dict:
+        return self.pool.stats() if self.pool else {}
 
     def init(self):
         if not self.is_enabled():
             return
+        self.pool.prefill()
         with self.conn() as c:
             with c.cursor() as cur:
                 cur.execute(
@@ -100,26 +740,319 @@ class Db:
                     );
                     """
                 )
+                # Admin listing: display names computed at write time + keyset pagination indexes.
+                cur.execute("ALTER TABLE game_history ADD COLUMN IF NOT EXISTS players_display TEXT;")
+                cur.execute(
+                    """
+                    UPDATE game_history
+                    SET players_display = COALESCE((
+                        SELECT string_agg(COALESCE(p->>'name', p #>> '{}'), ', ')
+                        FROM jsonb_array_elements(players) AS p
+                    ), '')
+                    WHERE players_display IS NULL AND jsonb_typeof(players) = 'array';
+                    """
+                )
+                cur.execute("CREATE INDEX IF NOT EXISTS game_history_started_idx ON game_history (started_at DESC, id DESC);")
+                cur.execute("CREATE INDEX IF NOT EXISTS game_history_category_idx ON game_history (category, started_at DESC, id DESC);")
+                cur.execute("CREATE INDEX IF NOT EXISTS game_history_room_idx ON game_history (room_code, started_at DESC, id DESC);")
+                # Maintained counters (e.g. number of devices) so the dashboard doesn't COUNT(*).
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS app_counters (
+                        name TEXT PRIMARY KEY,
+                        value BIGINT NOT NULL DEFAULT 0
+                    );
+                    """
+                )
+                # One-time seed for databases that already have devices; the WHERE makes
+                # later boots skip the COUNT(*) (ON CONFLICT alone still scans devices).
+                cur.execute(
+                    """
+                    INSERT INTO app_counters (name, value)
+                    SELECT 'devices', (SELECT COUNT(*) FROM devices)
+                    WHERE NOT EXISTS (SELECT 1 FROM app_counters WHERE name = 'devices')
+                    ON CONFLICT (name) DO NOTHING;
+                    """
+                )
+                # Normalized rounds/guesses (written by save_game) for analytics queries.
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS game_rounds (
+                        game_id TEXT NOT NULL,
+                        round_number INTEGER NOT NULL,
+                        category TEXT,
+                        song_title TEXT NOT NULL DEFAULT '',
+                        song_artist TEXT NOT NULL DEFAULT '',
+                        song_year INTEGER,
+                        dj_name TEXT,
+                        ended_at TIMESTAMPTZ,
+                        PRIMARY KEY (game_id, round_number)
+                    );
+                    """
+                )
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS round_guesses (
+                        game_id TEXT NOT NULL,
+                        round_number INTEGER NOT NULL,
+                        player_id TEXT NOT NULL,
+                        player_name TEXT,
+                        guess_year INTEGER,
+                        points INTEGER NOT NULL DEFAULT 0,
+                        abs_error INTEGER,
+                        PRIMARY KEY (game_id, round_number, player_id)
+                    );
+                    """
+                )
+                cur.execute("CREATE INDEX IF NOT EXISTS game_rounds_song_idx ON game_rounds (song_title, song_artist, song_year);")
+                cur.execute("CREATE INDEX IF NOT EXISTS game_rounds_category_idx ON game_rounds (category);")
+                # Per-song totals maintained on insert, so the admin endpoints read
+                # one row per song instead of aggregating every guess.
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS song_stats (
+                        song_title TEXT NOT NULL,
+                        song_artist TEXT NOT NULL,
+                        song_year INTEGER NOT NULL DEFAULT 0,
+                        category TEXT NOT NULL DEFAULT '',
+                        guesses BIGINT NOT NULL DEFAULT 0,
+                        exact BIGINT NOT NULL DEFAULT 0,
+                        points_sum BIGINT NOT NULL DEFAULT 0,
+                        abs_error_sum BIGINT NOT NULL DEFAULT 0,
+                        PRIMARY KEY (song_title, song_artist, song_year, category)
+                    );
+                    """
+                )
+                cur.execute("CREATE INDEX IF NOT EXISTS song_stats_category_idx ON song_stats (category);")
+                # One HyperLogLog per day (all workers merged) for "unique devices last N days".
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS device_sketches (
+                        day DATE PRIMARY KEY,
+                        registers BYTEA NOT NULL
+                    );
+                    """
+                )
             c.commit()
+        self.ready = True
 
     def inc_metric(self, field: str, amount: int = 1):
+        """Count in memory; flush_metrics() writes the totals every few seconds."""
         if not self.is_enabled():
             return
-        if field not in {"visits", "rooms_created", "games_completed"}:
+        if field not in METRIC_FIELDS:
             return
+        day = datetime.now(timezone.utc).date()
+        with self._pending_lock:
+            row = self._pending.setdefault(day, dict.fromkeys(METRIC_FIELDS, 0))
+            row[field] += amount
+
+    def flush_metrics(self) -> int:
+        """Write the buffered counters in one batched upsert; returns the number of days written.
+
+        Delivery is at-least-once: if the write fails, the counts are merged back into
+        the buffer and retried on the next flush. So an error after Postgres already
+        committed (e.g. the connection dropped while reading the reply) can count those
+        increments twice. Counts not yet flushed when the process is killed hard are
+        lost (at most METRICS_FLUSH_SECONDS worth); a normal shutdown flushes via atexit.
+        """
+        if not self.is_enabled():
+            return 0
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        rows = [(day, v["visits"], v["rooms_created"], v["games_completed"]) for day, v in sorted(pending.items())]
+        try:
+            self._write_metrics(rows)
+            self.invalidate_summary()
+        except Exception:
+            with self._pending_lock:
+                for day, v in pending.items():
+                    row = self._pending.setdefault(day, dict.fromkeys(METRIC_FIELDS, 0))
+                    for field in METRIC_FIELDS:
+                        row[field] += v[field]
+            raise
+        return len(rows)
+
+    def _write_metrics(self, rows: list):
         with self.conn() as c:
             with c.cursor() as cur:
-                cur.execute(
-                    f"""
-                    INSERT INTO daily_metrics (day, {field})
-                    VALUES (CURRENT_DATE, %s)
+                psycopg2.extras.execute_values(
+                    cur,
+                    """
+                    INSERT INTO daily_metrics (day, visits, rooms_created, games_completed)
+                    VALUES %s
                     ON CONFLICT (day) DO UPDATE
-                    SET {field} = daily_metrics.{field} + EXCLUDED.{field};
+                    SET visits = daily_metrics.visits + EXCLUDED.visits,
+                        rooms_created = daily_metrics.rooms_created + EXCLUDED.rooms_created,
+                        games_completed = daily_metrics.games_completed + EXCLUDED.games_completed;
                     """,
-                    (amount,),
+                    rows,
                 )
             c.commit()
 
+    def note_device(self, device_id: str):
+        """Add a device to today's unique-devices sketch (flushed with the metrics)."""
+        if not self.is_enabled() or not device_id:
+            return
+        day = datetime.now(timezone.utc).date()
+        with self._pending_lock:
+            sketch = self._sketches.get(day)
+            if sketch is None:
+                sketch = self._sketches[day] = HyperLogLog()
+            sketch.add(device_id)
+
+    def flush_sketches(self) -> int:
+        """Merge the local day sketches into device_sketches; returns the number of days written.
+
+        Merging is idempotent, so a sketch that fails to write is simply kept and merged
+        again later.
+        """
+        if not self.is_enabled():
+            return 0
+        with self._pending_lock:
+            sketches, self._sketches = self._sketches, {}
+        if not sketches:
+            return 0
+        items = sorted(sketches.items())
+        try:
+            self._write_sketches(items)
+            self.invalidate_summary()
+        except Exception:
+            with self._pending_lock:
+                for day, sketch in items:
+                    if day in self._sketches:
+                        self._sketches[day].merge(sketch)
+                    else:
+                        self._sketches[day] = sketch
+            raise
+        return len(items)
+
+    def _write_sketches(self, items: list):
+        with self.conn() as c:
+            with c.cursor() as cur:
+                for day, sketch in items:
+                    cur.execute(
+                        "INSERT INTO device_sketches (day, registers) VALUES (%s, %s) ON CONFLICT (day) DO NOTHING;",
+                        (day, psycopg2.Binary(sketch.to_bytes())),
+                    )
+                    if cur.rowcount == 1:
+                        continue
+                    # Merge with what other workers wrote (row lock until commit).
+                    cur.execute("SELECT registers FROM device_sketches WHERE day = %s FOR UPDATE;", (day,))
+                    merged = HyperLogLog.from_bytes(bytes(cur.fetchone()[0]))
+                    merged.merge(sketch)
+                    cur.execute(
+                        "UPDATE device_sketches SET registers = %s WHERE day = %s;",
+                        (psycopg2.Binary(merged.to_bytes()), day),
+                    )
+            c.commit()
+
+    def _read_sketches(self, since: date) -> list:
+        with self.conn() as c:
+            with c.cursor() as cur:
+                cur.execute("SELECT registers FROM device_sketches WHERE day >= %s;", (since,))
+                return [bytes(r[0]) for r in cur.fetchall()]
+
+    def unique_devices(self, days: int) -> int:
+        """Estimated distinct devices over the last `days` days (today included)."""
+        if not self.is_enabled():
+            return 0
+        since = date.fromordinal(datetime.now(timezone.utc).date().toordinal() - int(days) + 1)
+        total = HyperLogLog()
+        for data in self._read_sketches(since):
+            total.merge(HyperLogLog.from_bytes(data))
+        with self._pending_lock:
+            local = [s for day, s in self._sketches.items() if day >= since]
+            for sketch in local:
+                total.merge(sketch)
+        return total.count()
+
+    def start_warmup(self):
+        """Run init() on a background thread so it doesn't delay the first request.
+
+        Until it is done DB calls fail fast and everything is buffered, as while the
+        circuit breaker is open; if init() fails the breaker opens and retries it.
+        """
+        if not self.is_enabled():
+            return
+        self.breaker.state = "warming"
+
+        def run():
+            try:
+                self.init()
+            except Exception as e:
+                self.breaker.trip(e)
+                return
+            self.breaker.reset()
+            BOOT_STATS["db_ready_ms"] = round((time.perf_counter() - BOOT_STARTED) * 1000, 1)
+            print(f"DB ready after {BOOT_STATS['db_ready_ms']:.0f} ms")
+
+        threading.Thread(target=run, name="db-warmup", daemon=True).start()
+
+    def _ping(self):
+        with self.conn() as c:
+            with c.cursor() as cur:
+                cur.execute("SELECT 1;")
+
+    def _check(self):
+        # Breaker probe: finish a failed init() first, then just ping.
+        if not self.ready:
+            self.init()
+        else:
+            self._ping()
+
+    def _defer_device(self, device_id: str):
+        with self._pending_lock:
+            self._pending_devices[device_id] = None
+            while len(self._pending_devices) > DB_PENDING_DEVICES_MAX:
+                self._pending_devices.popitem(last=False)
+
+    def replay_devices(self, limit: int = 500) -> int:
+        """Register up to `limit` devices that were seen while the DB was down.
+
+        Every device is its own breaker call, so a long replay isn't one slow call that
+        trips the breaker again; raises DbUnavailable if it opens meanwhile.
+        """
+        with self._pending_lock:
+            batch = list(itertools.islice(self._pending_devices, limit))
+        for device_id in batch:
+            self.breaker.call(self.upsert_device, device_id)
+            self.device_cache.add(device_id)
+            with self._pending_lock:
+                self._pending_devices.pop(device_id, None)
+        return len(batch)
+
+    def _metrics_flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_SECONDS)
+            if not self.breaker.probe(self._check):
+                continue  # DB still down; everything stays buffered
+            for flush in (self.flush_metrics, self.flush_sketches, self.replay_devices):
+                try:
+                    if flush == self.replay_devices:
+                        flush()  # goes through the breaker per device
+                    else:
+                        self.breaker.call(flush)
+                except DbUnavailable:
+                    break
+                except Exception as e:
+                    print(f"DB.{flush.__name__} failed:", e)
+
+    def start_metrics_flusher(self):
+        if not self.is_enabled():
+            return
+        threading.Thread(target=self._metrics_flush_loop, name="metrics-flush", daemon=True).start()
+        atexit.register(self._flush_at_exit)
+
+    def _flush_at_exit(self):
+        for flush in (self.flush_metrics, self.flush_sketches):
+            try:
+                self.breaker.call(flush)
+            except Exception as e:
+                print(f"DB.{flush.__name__} at exit failed:", e)
+
     def upsert_device(self, device_id: str) -> bool:
         """Return True if it's the first time we've seen this device (in DB)."""
         if not self.is_enabled():
@@ -138,6 +1071,8 @@ class Db:
                     (h,),
                 )
                 inserted = cur.rowcount == 1
+                if inserted:
+                    cur.execute("UPDATE app_counters SET value = value + 1 WHERE name = 'devices';")
             c.commit()
         return inserted
 
@@ -178,9 +1113,28 @@ class Db:
                 )
             c.commit()
 
+    def invalidate_summary(self):
+        with self._summary_lock:
+            self._summary_cache.clear()
+
     def admin_summary(self, days: int = 30) -> dict:
+        """Dashboard numbers, cached for ADMIN_SUMMARY_TTL seconds (and dropped when
+        buffered counters or games are written)."""
         if not self.is_enabled():
             return {}
+        with self._summary_lock:
+            cached = self._summary_cache.get(days)
+            if cached and (cached[0] > time.time() or not self.breaker.allow()):
+                # Fresh, or the DB is down and stale numbers beat none.
+                return cached[1]
+        summary = self.breaker.call(self._admin_summary_query, days)
+        summary["unique_devices_7d"] = self.breaker.call(self.unique_devices, 7)
+        summary["unique_devices_30d"] = self.breaker.call(self.unique_devices, 30)
+        with self._summary_lock:
+            self._summary_cache[days] = (time.time() + ADMIN_SUMMARY_TTL, summary)
+        return summary
+
+    def _admin_summary_query(self, days: int) -> dict:
         with self.conn() as c:
             with c.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                 cur.execute(
@@ -193,8 +1147,9 @@ class Db:
                     (days,),
                 )
                 series = list(cur.fetchall())
-                cur.execute("SELECT COUNT(*) AS unique_devices FROM devices;")
-                unique_devices = cur.fetchone()["unique_devices"]
+                cur.execute("SELECT value AS unique_devices FROM app_counters WHERE name = 'devices';")
+                row = cur.fetchone()
+                unique_devices = row["unique_devices"] if row else 0
                 cur.execute(
                     """
                     SELECT COUNT(*) AS games_total,
@@ -210,20 +1165,46 @@ class Db:
                 "games_finished": int(games_meta.get("games_finished") or 0),
             }
 
-    def list_games(self, limit: int = 50) -> list:
+    def parse_cursor(self, cursor: str) -> tuple:
+        """(started_at, game_id) of a list_games cursor; ValueError if it is malformed."""
+        started_at, sep, game_id = str(cursor).rpartition("|")
+        if not sep or not game_id:
+            raise ValueError("cursor must be <started_at>|<id>")
+        datetime.fromisoformat(started_at)
+        return started_at, game_id
+
+    def list_games(self, limit: int = 50, cursor: Optional[str] = None,
+                   category: Optional[str] = None, room_code: Optional[str] = None) -> list:
+        """Newest games first. `cursor` is the `cursor` of the last row of the previous page
+        (keyset pagination on (started_at, id), so deep pages stay as cheap as the first)."""
         if not self.is_enabled():
             return []
         limit = max(1, min(int(limit or 50), 200))
+        where = []
+        params = []
+        if cursor:
+            where.append("(started_at, id) < (%s::timestamptz, %s)")
+            params += list(self.parse_cursor(cursor))
+        if category:
+            where.append("category = %s")
+            params.append(category)
+        if room_code:
+            where.append("room_code = %s")
+            params.append(room_code)
+        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
         with self.conn() as c:
             with c.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
                 cur.execute(
-                    """
-                    SELECT id, room_code AS room, started_at::text AS started_at, ended_at::text AS ended_at, category, rounds_total, players
+                    f"""
+                    SELECT id, room_code AS room, started_at::text AS started_at, ended_at::text AS ended_at,
+                           category, rounds_total, COALESCE(players_display, '') AS players_display,
+                           started_at::text || '|' || id AS cursor
                     FROM game_history
-                    ORDER BY started_at DESC
+                    {where_sql}
+                    ORDER BY started_at DESC, id DESC
                     LIMIT %s;
                     """,
-                    (limit,),
+                    (*params, limit),
                 )
                 return list(cur.fetchall())
 
@@ -247,8 +1228,20 @@ class Db:
         """Compatibility alias used by older code."""
         return self.inc_metric(field, amount)
     def register_device(self, device_id: str):
-        """Compatibility alias used by older code."""
-        return self.upsert_device(device_id)
+        """Compatibility alias used by older code; skips devices this process already wrote."""
+        if not self.is_enabled():
+            return False
+        self.note_device(device_id)
+        if self.device_cache.seen(device_id):
+            return False
+        try:
+            inserted = self.breaker.call(self.upsert_device, device_id)
+        except Exception:
+            # DB down or failing: remember the device and write it on recovery.
+            self._defer_device(device_id)
+            return False
+        self.device_cache.add(device_id)
+        return inserted
     def save_game(self, game_id: str, *args, **kwargs) -> None:
         """Compatibility save_game used by server code across versions.
 
@@ -300,12 +1293,18 @@ class Db:
         except Exception:
             ended_at_f = float(now())
 
+        self._write_game(str(game_id), str(room_code or ""), started_at_f, ended_at_f, category,
+                         int(rounds_total or 0), players, history)
+        self.invalidate_summary()
+
+    def _write_game(self, game_id: str, room_code: str, started_at: float, ended_at: float,
+                    category, rounds_total: int, players, history):
         with self.conn() as c:
             with c.cursor() as cur:
                 cur.execute(
                     """
-                    INSERT INTO game_history (id, room_code, started_at, ended_at, category, rounds_total, players, history)
-                    VALUES (%s, %s, to_timestamp(%s), to_timestamp(%s), %s, %s, %s::jsonb, %s::jsonb)
+                    INSERT INTO game_history (id, room_code, started_at, ended_at, category, rounds_total, players, history, players_display)
+                    VALUES (%s, %s, to_timestamp(%s), to_timestamp(%s), %s, %s, %s::jsonb, %s::jsonb, %s)
                     ON CONFLICT (id) DO UPDATE
                     SET room_code = EXCLUDED.room_code,
                         started_at = EXCLUDED.started_at,
@@ -313,54 +1312,773 @@ class Db:
                         category = EXCLUDED.category,
                         rounds_total = EXCLUDED.rounds_total,
                         players = EXCLUDED.players,
-                        history = EXCLUDED.history;
+                        history = EXCLUDED.history,
+                        players_display = EXCLUDED.players_display;
                     """,
                     (
-                        str(game_id),
-                        str(room_code or ""),
-                        started_at_f,
-                        ended_at_f,
+                        game_id,
+                        room_code,
+                        started_at,
+                        ended_at,
                         category,
-                        int(rounds_total or 0),
+                        rounds_total,
                         json.dumps(players or []),
                         json.dumps(history or []),
+                        ", ".join(player_names(players)),
                     ),
                 )
+                self._save_rounds(cur, game_id, category, history)
             c.commit()
 
+    def _save_rounds(self, cur, game_id: str, category, history):
+        """Write game_rounds/round_guesses rows for `history` and bump song_stats.
+
+        save_game runs several times per game (start, end) with a growing history, so
+        rows that already exist are skipped and only newly inserted guesses are added
+        to the per-song totals.
+        """
+        rounds, guesses = round_rows(game_id, category, history)
+        if not rounds:
+            return
+        psycopg2.extras.execute_values(
+            cur,
+            """
+            INSERT INTO game_rounds (game_id, round_number, category, song_title, song_artist, song_year, dj_name, ended_at)
+            VALUES %s
+            ON CONFLICT (game_id, round_number) DO NOTHING;
+            """,
+            rounds,
+            template="(%s, %s, %s, %s, %s, %s, %s, to_timestamp(%s))",
+        )
+        if not guesses:
+            return
+        inserted = psycopg2.extras.execute_values(
+            cur,
+            """
+            INSERT INTO round_guesses (game_id, round_number, player_id, player_name, guess_year, points, abs_error)
+            VALUES %s
+            ON CONFLICT (game_id, round_number, player_id) DO NOTHING
+            RETURNING round_number, points, abs_error;
+            """,
+            guesses,
+            fetch=True,
+        )
+        songs = {r[1]: (r[3], r[4], r[5] or 0, r[2] or "") for r in rounds}
+        totals = {}
+        for round_number, points, abs_error in inserted:
+            t = totals.setdefault(songs[round_number], [0, 0, 0, 0])
+            t[0] += 1
+            t[1] += 1 if abs_error == 0 else 0
+            t[2] += points or 0
+            t[3] += abs_error or 0
+        if not totals:
+            return
+        psycopg2.extras.execute_values(
+            cur,
+            """
+            INSERT INTO song_stats (song_title, song_artist, song_year, category, guesses, exact, points_sum, abs_error_sum)
+            VALUES %s
+            ON CONFLICT (song_title, song_artist, song_year, category) DO UPDATE
+            SET guesses = song_stats.guesses + EXCLUDED.guesses,
+                exact = song_stats.exact + EXCLUDED.exact,
+                points_sum = song_stats.points_sum + EXCLUDED.points_sum,
+                abs_error_sum = song_stats.abs_error_sum + EXCLUDED.abs_error_sum;
+            """,
+            [(*key, *t) for key, t in sorted(totals.items())],
+        )
+
+    def song_accuracy(self, category: Optional[str] = None, min_guesses: int = 5,
+                      hardest: bool = True, limit: int = 50) -> list:
+        """Songs ranked by average distance between guess and release year."""
+        if not self.is_enabled():
+            return []
+        limit = max(1, min(int(limit or 50), 500))
+        where = ["guesses >= %s"]
+        params = [max(1, int(min_guesses or 1))]
+        if category:
+            where.append("category = %s")
+            params.append(category)
+        order = "DESC" if hardest else "ASC"
+        with self.conn() as c:
+            with c.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(
+                    f"""
+                    SELECT song_title AS title, song_artist AS artist, song_year AS year, category, guesses,
+                           ROUND(exact::numeric / guesses, 3)::float AS exact_rate,
+                           ROUND(points_sum::numeric / guesses, 2)::float AS avg_points,
+                           ROUND(abs_error_sum::numeric / guesses, 2)::float AS avg_error
+                    FROM song_stats
+                    WHERE {" AND ".join(where)}
+                    ORDER BY abs_error_sum::float / guesses {order}, guesses DESC
+                    LIMIT %s;
+                    """,
+                    (*params, limit),
+                )
+                return list(cur.fetchall())
+
+    def category_difficulty(self) -> list:
+        """Per-category totals from song_stats, hardest (largest average error) first."""
+        if not self.is_enabled():
+            return []
+        with self.conn() as c:
+            with c.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(
+                    """
+                    SELECT category, COUNT(*) AS songs, SUM(guesses)::bigint AS guesses,
+                           ROUND(SUM(exact)::numeric / SUM(guesses), 3)::float AS exact_rate,
+                           ROUND(SUM(points_sum)::numeric / SUM(guesses), 2)::float AS avg_points,
+                           ROUND(SUM(abs_error_sum)::numeric / SUM(guesses), 2)::float AS avg_error
+                    FROM song_stats
+                    GROUP BY category
+                    HAVING SUM(guesses) > 0
+                    ORDER BY avg_error DESC;
+                    """
+                )
+                return list(cur.fetchall())
+
     def game_by_id(self, game_id: str):
         """Backward-compatible alias used by some admin routes."""
         return self.get_game(game_id)
 
+    def breaker_stats(self) -> dict:
+        """Circuit breaker state plus what is buffered in memory until the DB is back."""
+        with self._pending_lock:
+            buffered = {
+                "buffered_metric_days": len(self._pending),
+                "buffered_sketch_days": len(self._sketches),
+                "buffered_devices": len(self._pending_devices),
+            }
+        return dict(self.breaker.stats(), **buffered)
+
+    def device_counts(self) -> dict:
+        """Estimated unique devices for the last 7 and 30 days (cached with the summary)."""
+        try:
+            s = self.admin_summary()
+            return {"7d": s.get("unique_devices_7d", 0), "30d": s.get("unique_devices_30d", 0)}
+        except Exception:
+            return {}
+
     def daily_metrics(self, days: int = 30):
         """Return daily series for the last N days."""
         try:
             return self.admin_summary(days=days).get("series", [])
         except Exception:
             return []
-    def recent_games(self, limit: int = 200):
-        """Return recent finished games."""
+    def recent_games(self, limit: int = 200, **filters):
+        """Return recent finished games (see list_games for cursor/category/room_code)."""
         try:
-            return self.list_games(limit=limit)
+            return self.breaker.call(self.list_games, limit=limit, **filters)
         except Exception:
             return []
     def game_details(self, game_id: int):
         """Return stored game record."""
         try:
-            return self.get_game(game_id)
+            return self.breaker.call(self.get_game, game_id)
         except Exception:
             return None
 
-DB = Db(DB_URL if DB_AVAILABLE else None)
-try:
-    DB.init()
-except Exception as e:
-    # If DB is misconfigured, keep the game running on in-memory mode.
-    DB = Db(None)
+# SQLite backend: at most this many queued writes share one transaction/commit.
+SQLITE_WRITE_BATCH = int(os.getenv("SQLITE_WRITE_BATCH", "500") or 500)
+
+
+class SqliteWriter:
+    """Single writer thread for a SQLite database (group commit).
+
+    Callers hand in a function that takes the connection; queued functions run one
+    after another inside a single transaction (each under its own savepoint, so one
+    failing write doesn't undo the others) and are committed together.
+    """
+
+    def __init__(self, path: str, batch_max: int = SQLITE_WRITE_BATCH):
+        self.path = path
+        self.batch_max = max(1, batch_max)
+        self._queue = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self.metrics = {"writes": 0, "commits": 0, "errors": 0, "max_batch": 0}
+
+    def run(self, fn):
+        """Run fn(conn) on the writer thread and return its result (or raise its error)."""
+        job = {"fn": fn, "done": threading.Event()}
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="sqlite-writer", daemon=True)
+                self._thread.start()
+            self._queue.append(job)
+            self._cond.notify()
+        job["done"].wait()
+        if "error" in job:
+            raise job["error"]
+        return job.get("result")
+
+    def _connect(self) -> sqlite3.Connection:
+        c = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        c.execute("PRAGMA journal_mode=WAL;")
+        c.execute("PRAGMA synchronous=NORMAL;")
+        return c
+
+    def _loop(self):
+        c = None
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                batch, self._queue = self._queue[:self.batch_max], self._queue[self.batch_max:]
+            try:
+                if c is None:
+                    c = self._connect()
+                c.execute("BEGIN IMMEDIATE;")
+                for job in batch:
+                    c.execute("SAVEPOINT job;")
+                    try:
+                        job["result"] = job["fn"](c)
+                        c.execute("RELEASE job;")
+                    except Exception as e:
+                        c.execute("ROLLBACK TO job;")
+                        c.execute("RELEASE job;")
+                        job["error"] = e
+                c.execute("COMMIT;")
+            except Exception as e:
+                try:
+                    if c is not None and c.in_transaction:
+                        c.execute("ROLLBACK;")
+                except Exception:
+                    # Reconnect on the next batch.
+                    c.close()
+                    c = None
+                for job in batch:
+                    job.pop("result", None)
+                    job.setdefault("error", e)
+            with self._cond:
+                self.metrics["writes"] += len(batch)
+                self.metrics["commits"] += 1
+                self.metrics["errors"] += sum(1 for job in batch if "error" in job)
+                self.metrics["max_batch"] = max(self.metrics["max_batch"], len(batch))
+            for job in batch:
+                job["done"].set()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self.metrics, queued=len(self._queue))
+
+
+def _epoch_dt(v):
+    return datetime.fromtimestamp(float(v), timezone.utc) if v is not None else None
+
+
+class SqliteDb(Db):
+    """Db on a local SQLite file (DATABASE_URL=sqlite:///path/musik.db).
+
+    Same methods and tables as the Postgres version. Reads use one connection per
+    thread; all writes go through a SqliteWriter, so concurrent saves are batched
+    into few commits. Timestamps are stored as epoch seconds.
+    """
+
+    def __init__(self, url: str):
+        super().__init__(url)
+        self.pool = None
+        self.path = url[len("sqlite:///"):]
+        self._local = threading.local()
+        self.writer = SqliteWriter(self.path)
+
+    def is_enabled(self) -> bool:
+        return bool(self.url) and not DB_DISABLED
+
+    def pool_stats(self) -> dict:
+        return dict(self.writer.stats(), backend="sqlite")
+
+    def _read(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=10)
+            c.row_factory = sqlite3.Row
+            self._local.conn = c
+        return c
+
+    def init(self):
+        if not self.is_enabled():
+            return
+        # executescript() commits on its own, so this runs before the writer thread starts.
+        c = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            c.execute("PRAGMA journal_mode=WAL;")
+            c.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS daily_metrics (
+                    day TEXT PRIMARY KEY,
+                    visits INTEGER NOT NULL DEFAULT 0,
+                    rooms_created INTEGER NOT NULL DEFAULT 0,
+                    games_completed INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS devices (
+                    device_hash TEXT PRIMARY KEY,
+                    first_seen REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS game_history (
+                    id TEXT PRIMARY KEY,
+                    room_code TEXT,
+                    started_at REAL NOT NULL,
+                    ended_at REAL,
+                    category TEXT,
+                    rounds_total INTEGER,
+                    players TEXT,
+                    history TEXT,
+                    players_display TEXT
+                );
+                CREATE INDEX IF NOT EXISTS game_history_started_idx ON game_history (started_at DESC, id DESC);
+                CREATE INDEX IF NOT EXISTS game_history_category_idx ON game_history (category, started_at DESC, id DESC);
+                CREATE INDEX IF NOT EXISTS game_history_room_idx ON game_history (room_code, started_at DESC, id DESC);
+                CREATE TABLE IF NOT EXISTS app_counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL DEFAULT 0
+                );
+                INSERT OR IGNORE INTO app_counters (name, value)
+                SELECT 'devices', (SELECT COUNT(*) FROM devices)
+                WHERE NOT EXISTS (SELECT 1 FROM app_counters WHERE name = 'devices');
+                CREATE TABLE IF NOT EXISTS game_rounds (
+                    game_id TEXT NOT NULL,
+                    round_number INTEGER NOT NULL,
+                    category TEXT,
+                    song_title TEXT NOT NULL DEFAULT '',
+                    song_artist TEXT NOT NULL DEFAULT '',
+                    song_year INTEGER,
+                    dj_name TEXT,
+                    ended_at REAL,
+                    PRIMARY KEY (game_id, round_number)
+                );
+                CREATE TABLE IF NOT EXISTS round_guesses (
+                    game_id TEXT NOT NULL,
+                    round_number INTEGER NOT NULL,
+                    player_id TEXT NOT NULL,
+                    player_name TEXT,
+                    guess_year INTEGER,
+                    points INTEGER NOT NULL DEFAULT 0,
+                    abs_error INTEGER,
+                    PRIMARY KEY (game_id, round_number, player_id)
+                );
+                CREATE INDEX IF NOT EXISTS game_rounds_song_idx ON game_rounds (song_title, song_artist, song_year);
+                CREATE INDEX IF NOT EXISTS game_rounds_category_idx ON game_rounds (category);
+                CREATE TABLE IF NOT EXISTS song_stats (
+                    song_title TEXT NOT NULL,
+                    song_artist TEXT NOT NULL,
+                    song_year INTEGER NOT NULL DEFAULT 0,
+                    category TEXT NOT NULL DEFAULT '',
+                    guesses INTEGER NOT NULL DEFAULT 0,
+                    exact INTEGER NOT NULL DEFAULT 0,
+                    points_sum INTEGER NOT NULL DEFAULT 0,
+                    abs_error_sum INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (song_title, song_artist, song_year, category)
+                );
+                CREATE INDEX IF NOT EXISTS song_stats_category_idx ON song_stats (category);
+                CREATE TABLE IF NOT EXISTS device_sketches (
+                    day TEXT PRIMARY KEY,
+                    registers BLOB NOT NULL
+                );
+                """
+            )
+        finally:
+            c.close()
+        self.ready = True
+
+    def _write_metrics(self, rows: list):
+        def write(c):
+            c.executemany(
+                """
+                INSERT INTO daily_metrics (day, visits, rooms_created, games_completed)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (day) DO UPDATE
+                SET visits = visits + excluded.visits,
+                    rooms_created = rooms_created + excluded.rooms_created,
+                    games_completed = games_completed + excluded.games_completed;
+                """,
+                [(day.isoformat(), *counts) for day, *counts in rows],
+            )
+        self.writer.run(write)
+
+    def _write_sketches(self, items: list):
+        def write(c):
+            for day, sketch in items:
+                row = c.execute("SELECT registers FROM device_sketches WHERE day = ?;", (day.isoformat(),)).fetchone()
+                if row:
+                    merged = HyperLogLog.from_bytes(row[0])
+                    merged.merge(sketch)
+                    sketch = merged
+                c.execute(
+                    "INSERT OR REPLACE INTO device_sketches (day, registers) VALUES (?, ?);",
+                    (day.isoformat(), sketch.to_bytes()),
+                )
+        self.writer.run(write)
+
+    def _ping(self):
+        self._read().execute("SELECT 1;")
+
+    def _read_sketches(self, since: date) -> list:
+        rows = self._read().execute("SELECT registers FROM device_sketches WHERE day >= ?;", (since.isoformat(),))
+        return [bytes(r[0]) for r in rows]
+
+    def upsert_device(self, device_id: str) -> bool:
+        if not self.is_enabled():
+            return False
+        h = _hash_device(device_id)
+        if not h:
+            return False
+
+        def write(c):
+            cur = c.execute("INSERT OR IGNORE INTO devices (device_hash, first_seen) VALUES (?, ?);", (h, time.time()))
+            if cur.rowcount == 1:
+                c.execute("UPDATE app_counters SET value = value + 1 WHERE name = 'devices';")
+                return True
+            return False
+        return self.writer.run(write)
+
+    def _write_game(self, game_id: str, room_code: str, started_at: float, ended_at: float,
+                    category, rounds_total: int, players, history):
+        row = (game_id, room_code, started_at, ended_at, category, rounds_total,
+               json.dumps(players or []), json.dumps(history or []), ", ".join(player_names(players)))
+        rounds, guesses = round_rows(game_id, category, history)
+
+        def write(c):
+            c.execute(
+                """
+                INSERT INTO game_history (id, room_code, started_at, ended_at, category, rounds_total, players, history, players_display)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE
+                SET room_code = excluded.room_code,
+                    started_at = excluded.started_at,
+                    ended_at = excluded.ended_at,
+                    category = excluded.category,
+                    rounds_total = excluded.rounds_total,
+                    players = excluded.players,
+                    history = excluded.history,
+                    players_display = excluded.players_display;
+                """,
+                row,
+            )
+            c.executemany(
+                """
+                INSERT OR IGNORE INTO game_rounds (game_id, round_number, category, song_title, song_artist, song_year, dj_name, ended_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+                """,
+                rounds,
+            )
+            # Row by row so we know which guesses are new (see Db._save_rounds).
+            songs = {r[1]: (r[3], r[4], r[5] or 0, r[2] or "") for r in rounds}
+            for g in guesses:
+                cur = c.execute(
+                    """
+                    INSERT OR IGNORE INTO round_guesses (game_id, round_number, player_id, player_name, guess_year, points, abs_error)
+                    VALUES (?, ?, ?, ?, ?, ?, ?);
+                    """,
+                    g,
+                )
+                if cur.rowcount != 1:
+                    continue
+                points, abs_error = g[5], g[6]
+                c.execute(
+                    """
+                    INSERT INTO song_stats (song_title, song_artist, song_year, category, guesses, exact, points_sum, abs_error_sum)
+                    VALUES (?, ?, ?, ?, 1, ?, ?, ?)
+                    ON CONFLICT (song_title, song_artist, song_year, category) DO UPDATE
+                    SET guesses = guesses + 1,
+                        exact = exact + excluded.exact,
+                        points_sum = points_sum + excluded.points_sum,
+                        abs_error_sum = abs_error_sum + excluded.abs_error_sum;
+                    """,
+                    (*songs[g[1]], 1 if abs_error == 0 else 0, points or 0, abs_error or 0),
+                )
+        self.writer.run(write)
+
+    def _admin_summary_query(self, days: int) -> dict:
+        c = self._read()
+        since = date.fromordinal(datetime.now(timezone.utc).date().toordinal() - int(days))
+        series = []
+        for r in c.execute(
+            "SELECT day, visits, rooms_created, games_completed FROM daily_metrics WHERE day >= ? ORDER BY day;",
+            (since.isoformat(),),
+        ):
+            series.append(dict(r, day=date.fromisoformat(r["day"])))
+        row = c.execute("SELECT value FROM app_counters WHERE name = 'devices';").fetchone()
+        games = c.execute("SELECT COUNT(*) AS total, COUNT(ended_at) AS finished FROM game_history;").fetchone()
+        return {
+            "series": series,
+            "unique_devices": int(row["value"]) if row else 0,
+            "games_total": int(games["total"] or 0),
+            "games_finished": int(games["finished"] or 0),
+        }
+
+    def parse_cursor(self, cursor: str) -> tuple:
+        started_at, sep, game_id = str(cursor).rpartition("|")
+        if not sep or not game_id or not math.isfinite(float(started_at)):
+            raise ValueError("cursor must be <started_at>|<id>")
+        return float(started_at), game_id
+
+    def list_games(self, limit: int = 50, cursor: Optional[str] = None,
+                   category: Optional[str] = None, room_code: Optional[str] = None) -> list:
+        if not self.is_enabled():
+            return []
+        limit = max(1, min(int(limit or 50), 200))
+        where = []
+        params = []
+        if cursor:
+            where.append("(started_at, id) < (?, ?)")
+            params += list(self.parse_cursor(cursor))
+        if category:
+            where.append("category = ?")
+            params.append(category)
+        if room_code:
+            where.append("room_code = ?")
+            params.append(room_code)
+        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+        rows = self._read().execute(
+            f"""
+            SELECT id, room_code AS room,
+                   strftime('%Y-%m-%d %H:%M:%S', started_at, 'unixepoch') || '+00' AS started_at,
+                   strftime('%Y-%m-%d %H:%M:%S', ended_at, 'unixepoch') || '+00' AS ended_at,
+                   category, rounds_total, COALESCE(players_display, '') AS players_display,
+                   started_at AS started_ts
+            FROM game_history
+            {where_sql}
+            ORDER BY started_at DESC, id DESC
+            LIMIT ?;
+            """,
+            (*params, limit),
+        )
+        games = []
+        for r in rows:
+            g = dict(r)
+            # repr() round-trips the float exactly, so the next page starts right after it.
+            g["cursor"] = f"{g.pop('started_ts')!r}|{g['id']}"
+            games.append(g)
+        return games
+
+    def get_game(self, game_id: str) -> Optional[dict]:
+        if not self.is_enabled():
+            return None
+        row = self._read().execute(
+            """
+            SELECT id, room_code, started_at, ended_at, category, rounds_total, players, history
+            FROM game_history
+            WHERE id = ?;
+            """,
+            (str(game_id),),
+        ).fetchone()
+        if not row:
+            return None
+        g = dict(row)
+        g["started_at"] = _epoch_dt(g["started_at"])
+        g["ended_at"] = _epoch_dt(g["ended_at"])
+        g["players"] = json.loads(g["players"] or "[]")
+        g["history"] = json.loads(g["history"] or "[]")
+        return g
+
+    def song_accuracy(self, category: Optional[str] = None, min_guesses: int = 5,
+                      hardest: bool = True, limit: int = 50) -> list:
+        if not self.is_enabled():
+            return []
+        limit = max(1, min(int(limit or 50), 500))
+        where = ["guesses >= ?"]
+        params = [max(1, int(min_guesses or 1))]
+        if category:
+            where.append("category = ?")
+            params.append(category)
+        order = "DESC" if hardest else "ASC"
+        rows = self._read().execute(
+            f"""
+            SELECT song_title AS title, song_artist AS artist, song_year AS year, category, guesses,
+                   ROUND(CAST(exact AS REAL) / guesses, 3) AS exact_rate,
+                   ROUND(CAST(points_sum AS REAL) / guesses, 2) AS avg_points,
+                   ROUND(CAST(abs_error_sum AS REAL) / guesses, 2) AS avg_error
+            FROM song_stats
+            WHERE {" AND ".join(where)}
+            ORDER BY CAST(abs_error_sum AS REAL) / guesses {order}, guesses DESC
+            LIMIT ?;
+            """,
+            (*params, limit),
+        )
+        return [dict(r) for r in rows]
+
+    def category_difficulty(self) -> list:
+        if not self.is_enabled():
+            return []
+        rows = self._read().execute(
+            """
+            SELECT category, COUNT(*) AS songs, SUM(guesses) AS guesses,
+                   ROUND(CAST(SUM(exact) AS REAL) / SUM(guesses), 3) AS exact_rate,
+                   ROUND(CAST(SUM(points_sum) AS REAL) / SUM(guesses), 2) AS avg_points,
+                   ROUND(CAST(SUM(abs_error_sum) AS REAL) / SUM(guesses), 2) AS avg_error
+            FROM song_stats
+            GROUP BY category
+            HAVING SUM(guesses) > 0
+            ORDER BY avg_error DESC;
+            """
+        )
+        return [dict(r) for r in rows]
+
+
+def make_db(url: Optional[str]) -> Db:
+    """DATABASE_URL=sqlite:///path uses SqliteDb; anything else is Postgres."""
+    if url and url.startswith("sqlite:///"):
+        return SqliteDb(url)
+    return Db(url)
+
+
+DB = make_db(DB_URL if DB_AVAILABLE else None)
+DB.start_warmup()
+DB.start_metrics_flusher()
+
+
+# Game saves are written by a background thread so a slow DB never stalls a button press.
+GAME_SAVE_QUEUE_MAX = int(os.getenv("GAME_SAVE_QUEUE_MAX", "1000") or 1000)
+GAME_SAVE_MAX_ATTEMPTS = 8
+GAME_SAVE_BACKOFF_MAX = 60.0
+
+
+class GameSaveQueue:
+    """Bounded write-behind queue for Db.save_game.
+
+    Saves of the same game_id are coalesced (the latest fields win), failed saves are
+    retried with exponential backoff, and drain() flushes what's left at shutdown.
+    """
+
+    def __init__(self, db: Db, maxsize: int = GAME_SAVE_QUEUE_MAX):
+        self.db = db
+        self.maxsize = max(1, maxsize)
+        self._pending = OrderedDict()  # game_id -> save_game kwargs
+        self._cond = threading.Condition()
+        self._busy = False
+        self._thread = None
+        self.metrics = {"submitted": 0, "coalesced": 0, "saved": 0, "retries": 0, "dropped": 0}
+
+    def submit(self, game_id: str, **fields) -> bool:
+        """Queue a save; False if the queue is full."""
+        if not self.db.is_enabled():
+            return False
+        with self._cond:
+            self.metrics["submitted"] += 1
+            if game_id in self._pending:
+                self._pending[game_id] = fields
+                self.metrics["coalesced"] += 1
+                return True
+            if len(self._pending) >= self.maxsize:
+                self.metrics["dropped"] += 1
+                print("Game save queue full; dropping save of", game_id)
+                return False
+            self._pending[game_id] = fields
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="game-saves", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                game_id, fields = self._pending.popitem(last=False)
+                self._busy = True
+            attempt = 0
+            while True:
+                if self.db.breaker.state != "closed":
+                    # DB is down: hold the save (without using up attempts) until it is back.
+                    with self._cond:
+                        if game_id in self._pending:
+                            break
+                    time.sleep(1.0)
+                    continue
+                try:
+                    self.db.breaker.call(self.db.save_game, game_id, **fields)
+                    with self._cond:
+                        self.metrics["saved"] += 1
+                    break
+                except DbUnavailable:
+                    continue
+                except Exception as e:
+                    attempt += 1
+                    with self._cond:
+                        superseded = game_id in self._pending
+                        give_up = attempt >= GAME_SAVE_MAX_ATTEMPTS
+                        if give_up and not superseded:
+                            self.metrics["dropped"] += 1
+                        elif not superseded:
+                            self.metrics["retries"] += 1
+                    print(f"DB.save_game failed (attempt {attempt}):", e)
+                    if superseded or give_up:
+                        # A newer save of this game is queued (or we give up).
+                        break
+                    time.sleep(min(GAME_SAVE_BACKOFF_MAX, 0.5 * (2 ** attempt)))
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """Wait until every queued save has been written; True if the queue is empty."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._pending or self._busy:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(timeout=remaining)
+        return True
+
+    def stats(self) -> dict:
+        with self._cond:
+            # pending includes a save being written (or held while the DB is down)
+            return dict(self.metrics, pending=len(self._pending) + int(self._busy))
+
+
+def _int_or_none(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def round_rows(game_id: str, category, history) -> tuple:
+    """(game_rounds rows, round_guesses rows) for the round entries in a game's history."""
+    rounds, guesses = [], []
+    for entry in history or []:
+        if not isinstance(entry, dict) or "round_number" not in entry:
+            continue  # old event-style history
+        rn = _int_or_none(entry.get("round_number"))
+        if rn is None:
+            continue
+        song = entry.get("song") or {}
+        year = _int_or_none(song.get("year"))
+        rounds.append((game_id, rn, category or "", str(song.get("title") or ""), str(song.get("artist") or ""),
+                       year, entry.get("dj_name"), float(entry.get("ended_at") or now())))
+        for g in entry.get("guesses") or []:
+            guess = _int_or_none(g.get("guess_year"))
+            err = abs(guess - year) if guess is not None and year is not None else None
+            guesses.append((game_id, rn, str(g.get("player_id") or g.get("player_name") or ""),
+                            g.get("player_name"), guess, int(g.get("points") or 0), err))
+    return rounds, guesses
+
+
+def game_save_fields(room: dict, ended: bool = False) -> dict:
+    """Snapshot of a room for GameSaveQueue; copied so later mutations don't leak in."""
+    return {
+        "room_code": room.get("room_code"),
+        "started_at": room.get("game_started_at"),
+        "ended_at": room.get("game_ended_at") if ended else None,
+        "category": room.get("category"),
+        "rounds_total": room.get("rounds_total"),
+        "players": [dict(p) for p in room.get("players") or []],
+        "history": [history_entry_json(e) for e in room.get("history") or []],
+    }
+
+
+GAME_SAVES = GameSaveQueue(DB)
+atexit.register(GAME_SAVES.drain)
 
 
 def gen_code(n=4):
-    return "".join(random.choices(string.ascii_uppercase, k=n))
+    while True:
+        code = "".join(random.choices(string.ascii_uppercase, k=n))
+        # Behind shard_router.py, only hand out codes this worker owns.
+        if SHARD_COUNT <= 1 or shard_for(code, SHARD_COUNT) == SHARD_INDEX:
+            return code
 
 def gen_id():
     return "".join(random.choices(string.ascii_lowercase + string.digits, k=8))
@@ -368,38 +2086,385 @@ def gen_id():
 def now():
     return time.time()
 
-def load_songsets():
-    """Load all song json files from web/. Supports songs.json and songs_*.json."""
-    songsets = {}
-    # Default
+class _Column:
+    """A song column whose first `n` values come from a compiled catalog (read through
+    `get`) and whose later values, added by reloads, live in a list."""
+
+    __slots__ = ("_get", "_n", "_extra")
+
+    def __init__(self, get, n: int):
+        self._get, self._n, self._extra = get, n, []
+
+    def __len__(self) -> int:
+        return self._n + len(self._extra)
+
+    def __getitem__(self, i: int):
+        return self._get(i) if i < self._n else self._extra[i - self._n]
+
+    def append(self, value):
+        self._extra.append(value)
+
+
+class SongCatalog:
+    """One generation of the song catalog: songs stored column-wise and identified by
+    their index, categories as tuples of song ids. Generations share the (append-only)
+    columns, so song ids stay valid across reloads."""
+
+    def __init__(self, base: "SongCatalog" = None):
+        if base is None:
+            self.titles = []
+            self.artists = []
+            self.years = array("h")
+            self.urls = []
+            self._ids = {}    # (title, artist, year, url) -> id; shared by all generations
+            self.gen = 1
+            self.categories = {}
+            self.pending = {}
+        else:
+            self.titles, self.artists, self.years, self.urls = base.titles, base.artists, base.years, base.urls
+            self._ids = base._ids
+            self.gen = base.gen + 1
+            self.categories = dict(base.categories)  # name -> tuple of song ids
+            self.pending = dict(base.pending)        # name -> file, not parsed yet
+
+    @classmethod
+    def mapped(cls, compiled: CompiledCatalog) -> "SongCatalog":
+        """A first generation backed by a compiled catalog (songset_compiler.py)."""
+        catalog = cls()
+        n = compiled.count
+        catalog.titles = _Column(compiled.title, n)
+        catalog.artists = _Column(compiled.artist, n)
+        catalog.years = _Column(compiled.years.__getitem__, n)
+        catalog.urls = _Column(compiled.url, n)
+        catalog.categories = dict(compiled.categories)  # name -> memoryview of song ids
+        return catalog
+
+    def add_category(self, name: str, rows: list):
+        """Add a category from (title, artist, year, url) rows (see _songset_rows)."""
+        # Every song has its own key, so songs not in _ids yet came from a compiled
+        # catalog; they are only indexed once something is added.
+        for sid in range(len(self._ids), len(self.titles)):
+            self._ids[(self.titles[sid], self.artists[sid], self.years[sid], self.urls[sid])] = sid
+        ids = []
+        for title, artist, year, url in rows:
+            key = (sys.intern(title), sys.intern(artist), year, url)
+            sid = self._ids.get(key)
+            if sid is None:
+                sid = len(self.titles)
+                # The year column is the one that can reject a value (int16), so it goes
+                # first: a bad row then leaves every column as it was.
+                self.years.append(year)
+                self.titles.append(key[0])
+                self.artists.append(key[1])
+                self.urls.append(url)
+                self._ids[key] = sid
+            ids.append(sid)
+        self.categories[name] = tuple(ids)
+        self.pending.pop(name, None)
+
+    def _load(self, name: str):
+        # The only change ever made to a published generation. Under _songset_lock (shared
+        # with reloads), the ids are added before the name leaves `pending`, so readers
+        # without the lock see the category either pending or complete.
+        with _songset_lock:
+            path = self.pending.get(name)
+            if path is None:
+                return
+            try:
+                rows = _songset_rows(path, name)
+            except Exception as e:
+                rows = []
+                print(f"Songset {path} could not be loaded:", e)
+            if not rows:
+                # Like an unreadable file at startup: the category is no longer offered.
+                self.pending.pop(name, None)
+                self.freeze()
+                return
+            self.add_category(name, rows)
+
+    def freeze(self) -> "SongCatalog":
+        """Precompute what every request needs (sorted names, `categories` response)."""
+        self.names = sorted(set(self.categories) | set(self.pending))
+        self.categories_json = json.dumps({"ok": True, "categories": self.names}, ensure_ascii=False).encode("utf-8")
+        return self
+
+    def __contains__(self, category) -> bool:
+        """Whether a category can be played; parses it first if needed."""
+        if category in self.pending:
+            self._load(category)
+        return category in self.categories
+
+    def ids(self, category: str) -> tuple:
+        """Song ids of a category (empty if unknown); parses it on first use."""
+        name = category or "Standard"
+        if name in self.pending:
+            self._load(name)
+        return self.categories.get(name, ())
+
+    def year(self, sid: int) -> int:
+        return self.years[sid]
+
+    def song(self, sid: Optional[int]) -> Optional[dict]:
+        if sid is None:
+            return None
+        song = {"year": self.years[sid], "title": self.titles[sid], "artist": self.artists[sid]}
+        if self.urls[sid]:
+            song["spotifyUrl"] = self.urls[sid]
+        return song
+
+
+# Songset files are re-checked this often (seconds; 0 = never). With a shared room store
+# every worker must assign the same song ids, so there it is off unless set explicitly,
+# and all categories are parsed at startup (in file order) instead of on first use.
+SONGSET_WATCH_SECONDS = float(os.getenv("SONGSET_WATCH_SECONDS", "0" if rooms.shared else "5") or 0)
+SONGSET_EAGER = rooms.shared
+# Parsed songsets are cached here, keyed by a hash of the file ("" = no cache).
+SONGSET_CACHE_DIR = os.getenv("SONGSET_CACHE_DIR", ".songset-cache")
+# A compiled catalog (see songset_compiler.py) replaces the JSON files if it exists at
+# startup; it is mapped instead of parsed, and the watcher then follows that file.
+SONGSET_CATALOG = os.getenv("SONGSET_CATALOG", "songs.catalog")
+SONGSET_COMPILED = bool(SONGSET_CATALOG) and os.path.exists(SONGSET_CATALOG)
+_songset_lock = threading.RLock()
+_songset_stats = {}      # path -> (mtime, size) of the version in the current catalog
+_generations = OrderedDict()  # gen -> SongCatalog; older ones while rooms still draw from them
+# Updated under _songset_lock (by _songset_rows and _reload_compiled).
+SONGSET_STATS = {"compiled": SONGSET_COMPILED, "parsed": 0, "cache_hits": 0, "load_ms": 0.0}
+
+
+def _songset_rows(path: str, name: str = "") -> list:
+    """[(title, artist, year, url)] of a songset file, skipping songs that fail
+    songset_compiler.check_song (no title, year not a plausible whole number).
+
+    The result is cached as a marshal file named after the file's hash, so a later
+    start (or reload of an unchanged file) skips JSON parsing and validation. Call with
+    _songset_lock held (it updates SONGSET_STATS).
+    """
+    t0 = time.perf_counter()
+    with open(path, "rb") as f:
+        raw = f.read()
+    cache_path = None
+    if SONGSET_CACHE_DIR:
+        digest = hashlib.sha1(raw).hexdigest()
+        # v2: rows validated with check_song
+        cache_path = os.path.join(SONGSET_CACHE_DIR, f"{digest}.v2.m{marshal.version}")
+        try:
+            with open(cache_path, "rb") as f:
+                rows = marshal.load(f)
+            SONGSET_STATS["cache_hits"] += 1
+            SONGSET_STATS["load_ms"] += (time.perf_counter() - t0) * 1000
+            return rows
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+    songs = json.loads(raw)
+    if not isinstance(songs, list):
+        raise ValueError("not a JSON list")
+    rows = []
+    for s in songs:
+        song, problems = check_song(s)
+        if song is None:
+            print(f"Skipping song in {name or path!r}:", "; ".join(problems))
+        else:
+            rows.append(song)
+    SONGSET_STATS["parsed"] += 1
+    if cache_path:
+        try:
+            os.makedirs(SONGSET_CACHE_DIR, exist_ok=True)
+            tmp = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                marshal.dump(rows, f)
+            os.replace(tmp, cache_path)
+        except OSError as e:
+            print("Songset cache not written:", e)
+    SONGSET_STATS["load_ms"] += (time.perf_counter() - t0) * 1000
+    return rows
+
+
+def _file_stat(path: str):
     try:
-        with open("web/songs.json", encoding="utf-8") as f:
-            songsets["Standard"] = json.load(f)
-    except Exception:
-        songsets["Standard"] = []
-    # Extra categories
-    import glob, os
-    for path in glob.glob("web/songs_*.json"):
-        name = os.path.basename(path)
-        # songs_Danske 1960 til 2025.json -> Danske 1960 til 2025
-        cat = name[len("songs_"):-len(".json")]
-        cat = cat.replace("_", " ").strip()
-        if not cat:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def reload_songsets() -> Optional[list]:
+    """Publish a new catalog generation with new, changed and removed songset files;
+    returns the changed categories (None if nothing changed)."""
+    with _songset_lock:
+        base = globals().get("CATALOG")
+        if SONGSET_COMPILED:
+            return _reload_compiled(base)
+        paths = songset_paths()
+        stats = {path: _file_stat(path) for path in paths.values()}
+        changed = [cat for cat, path in paths.items() if base is None or stats[path] != _songset_stats.get(path)]
+        removed = [cat for cat in (base.names if base else ()) if cat not in paths]
+        if base is not None and not changed and not removed:
+            return None
+        catalog = SongCatalog(base)
+        for cat in removed:
+            catalog.categories.pop(cat, None)
+            catalog.pending.pop(cat, None)
+        applied = list(removed)
+        for cat in changed:
+            # Remember the version even if it is broken, so it is only retried once it changes.
+            _songset_stats[paths[cat]] = stats[paths[cat]]
+            if not SONGSET_EAGER and (base is None or cat not in base.categories):
+                catalog.pending[cat] = paths[cat]
+                applied.append(cat)
+                continue
+            try:
+                rows = _songset_rows(paths[cat], cat)
+            except Exception as e:
+                if base is not None and cat in base.categories:
+                    # Half-written or broken file: keep the previous version.
+                    print(f"Songset {paths[cat]} not reloaded:", e)
+                    continue
+                rows = []
+            catalog.add_category(cat, rows)
+            applied.append(cat)
+        if base is not None and not applied:
+            return None
+        _publish(catalog)
+        return applied
+
+
+def _reload_compiled(base: Optional[SongCatalog]) -> Optional[list]:
+    """reload_songsets() for a compiled catalog: mapped at startup, merged on change."""
+    global SONGSET_COMPILED
+    stat = _file_stat(SONGSET_CATALOG)
+    _warn_uncompiled_edits(stat)
+    if base is not None and stat == _songset_stats.get(SONGSET_CATALOG):
+        return None
+    _songset_stats[SONGSET_CATALOG] = stat
+    t0 = time.perf_counter()
+    try:
+        compiled = CompiledCatalog(SONGSET_CATALOG)
+    except (OSError, ValueError) as e:
+        print(f"Compiled catalog {SONGSET_CATALOG} not loaded:", e)
+        if base is not None:
+            return None
+        SONGSET_COMPILED = SONGSET_STATS["compiled"] = False
+        return reload_songsets()
+    if base is None:
+        catalog = SongCatalog.mapped(compiled)
+        applied = list(catalog.categories)
+    else:
+        # Songs are looked up in the current columns, so unchanged songs keep their ids.
+        catalog = SongCatalog(base)
+        applied = [cat for cat in base.categories if cat not in compiled.categories]
+        for cat in applied:
+            catalog.categories.pop(cat)
+        for cat in compiled.categories:
+            old = base.categories.get(cat)
+            catalog.add_category(cat, compiled.rows(cat))
+            if old is None or list(old) != list(catalog.categories[cat]):
+                applied.append(cat)
+        if not applied:
+            return None
+    SONGSET_STATS["load_ms"] += (time.perf_counter() - t0) * 1000
+    _publish(catalog)
+    return applied
+
+
+def _warn_uncompiled_edits(catalog_stat):
+    """With a compiled catalog the JSON files are not read; warn (once per change, at
+    startup and from the watcher) about files edited after the catalog was compiled."""
+    for path in songset_paths().values():
+        stat = _file_stat(path)
+        if stat == _songset_stats.get(path):
             continue
+        _songset_stats[path] = stat
+        if stat and catalog_stat and stat[0] > catalog_stat[0]:
+            print(f"{path} changed after {SONGSET_CATALOG} was compiled; run songset_compiler.py to use it")
+
+
+def _publish(catalog: SongCatalog):
+    global CATALOG
+    catalog.freeze()
+    _generations[catalog.gen] = catalog
+    CATALOG = catalog
+    sweep_generations()
+
+
+def catalog_generation(gen) -> Optional[SongCatalog]:
+    return _generations.get(gen)
+
+
+def sweep_generations() -> int:
+    """Drop old catalog generations that no room's song pool uses any more (called
+    after a reload and by the room reaper); returns how many were dropped.
+
+    Only the current generation gains new pools, so anything older that no room
+    refers to now can't be referred to later.
+    """
+    if len(_generations) <= 1:
+        return 0
+    current = CATALOG.gen
+    used = {(room.get("song_pool") or {}).get("gen") for _, room in list(rooms.items())}
+    with _songset_lock:
+        stale = [gen for gen in _generations if gen < current and gen not in used]
+        for gen in stale:
+            del _generations[gen]
+    return len(stale)
+
+
+def _songset_watch_loop():
+    while True:
+        time.sleep(SONGSET_WATCH_SECONDS)
         try:
-            with open(path, encoding="utf-8") as f:
-                songsets[cat] = json.load(f)
-        except Exception:
-            pass
+            changed = reload_songsets()
+            if changed:
+                print(f"Songsets reloaded (generation {CATALOG.gen}):", ", ".join(changed))
+        except Exception as e:
+            print("Songset reload failed:", e)
+
+
+def start_songset_watcher():
+    if SONGSET_WATCH_SECONDS > 0:
+        threading.Thread(target=_songset_watch_loop, name="songset-watch", daemon=True).start()
+
+
+reload_songsets()
 
-    return songsets
 
-SONGSETS = load_songsets()
+def new_song_pool(category: str) -> dict:
+    """Unplayed songs of a category as a lazy Fisher–Yates shuffle: the first `left`
+    positions of the category's ids are unplayed, `swaps` holds the moved positions."""
+    catalog = CATALOG
+    return {"category": category or "Standard", "gen": catalog.gen, "left": len(catalog.ids(category)), "swaps": {}}
 
-def get_songs_for_category(category: str):
-    if not category:
-        category = "Standard"
-    return SONGSETS.get(category) or SONGSETS.get("Standard") or []
+def draw_song(room) -> Optional[int]:
+    """Draw an unplayed song id from the room's category without replacement.
+
+    Starts a new pool when the category changed, every song has been played or the
+    pool's catalog generation is gone. The position is derived from the room's seed
+    and draw count, so a room's song order is reproducible. Returns None if the
+    category has no songs.
+    """
+    pool = room.get("song_pool")
+    catalog = catalog_generation(pool.get("gen")) if pool else None
+    if catalog is None or pool.get("category") != (room.get("category") or "Standard") or pool["left"] <= 0:
+        pool = room["song_pool"] = new_song_pool(room.get("category"))
+        catalog = catalog_generation(pool["gen"])
+        if pool["left"] <= 0:
+            return None
+    draws = room["song_draws"] = int(room.get("song_draws") or 0) + 1
+    digest = hashlib.blake2b(f"{room.get('song_seed', 0)}:{draws}".encode("utf-8"), digest_size=8).digest()
+    pos = int.from_bytes(digest, "big") % pool["left"]
+    last = pool["left"] - 1
+    swaps = pool["swaps"]
+    picked = swaps.get(str(pos), pos)
+    if pos != last:
+        swaps[str(pos)] = swaps.get(str(last), last)
+    swaps.pop(str(last), None)
+    pool["left"] = last
+    return catalog.ids(pool["category"])[picked]
+
+def history_entry_json(entry: dict) -> dict:
+    """A history entry as the client/DB sees it (song dict instead of song_id)."""
+    out = dict(entry)
+    out["song"] = CATALOG.song(out.pop("song_id", None))
+    return out
 def points_for_guess(guess: int, correct: int) -> int:
     d = abs(int(guess) - int(correct))
     return 3 if d == 0 else 2 if d == 1 else 1 if d == 2 else 0
@@ -437,11 +2502,231 @@ def all_non_dj_have_guessed(room) -> bool:
 def _players_by_id(room):
     return {p["id"]: p.get("name","") for p in room.get("players", [])}
 
+def room_condition(code: str) -> Optional[threading.Condition]:
+    """The room's lock/condition, or None if no such room is registered."""
+    with ROOMS_LOCK:
+        cond = _room_conditions.get(code)
+        if cond is None and rooms.shared and code in rooms:
+            # Room created by another worker
+            cond = _room_conditions[code] = threading.Condition(threading.RLock())
+        return cond
+
+def register_room(code: str, room: dict) -> bool:
+    """Add a new room; False if the code is already taken."""
+    with ROOMS_LOCK:
+        if not rooms.add(code, room):
+            return False
+        _room_conditions[code] = threading.Condition(threading.RLock())
+        return True
+
+@contextmanager
+def locked_room(code: str):
+    """Hold the room's lock and yield the room (None if it doesn't exist or was removed)."""
+    cond = room_condition(code) if code else None
+    if cond is None:
+        yield None
+        return
+    with cond:
+        # Removal needs this lock too, so once we hold it the room can't disappear.
+        yield rooms.get(code) if room_condition(code) is cond else None
+
+def notify_room(code: str):
+    """Wake every SSE listener of a room (after a mutation or when the room is removed)."""
+    with ROOMS_LOCK:
+        cond = _room_conditions.get(code)
+    if cond is None:
+        return
+    with cond:
+        cond.notify_all()
+
+def touch_room(room):
+    """Bump the room's state version. Call after every mutation so pollers see the change."""
+    room["version"] = int(room.get("version") or 0) + 1
+    after_commit(notify_room, room.get("room_code"))
+
+_room_effects = threading.local()
+
+def after_commit(fn, *args, **kwargs):
+    """Run fn once the room action in progress is committed (right away outside one).
+
+    With a shared room store api() re-runs an action after a version conflict, so side
+    effects (stats, game saves, round timers, SSE wake-ups) are queued per attempt and
+    only run for the attempt that was written.
+    """
+    queue = getattr(_room_effects, "queue", None)
+    if queue is None:
+        fn(*args, **kwargs)
+    else:
+        queue.append((fn, args, kwargs))
+
+def room_etag(room, view: str = "") -> str:
+    """ETag of one representation of a room: `view` is the player id (projections differ
+    per player) or "full". The catalog generation is part of it, since projections list
+    the available categories."""
+    return f'W/"{room.get("room_code", "")}-{int(room.get("version") or 0)}-{CATALOG.gen}-{view}"'
+
+# Room fields the lobby/round/result/end views in client.js render. Everything else
+# (song pool, device ids, left players, bookkeeping) stays on the server.
+PUBLIC_ROOM_FIELDS = (
+    "room_code", "version", "status", "started", "host_id", "category",
+    "rounds_total", "round_index", "dj_index", "timer_seconds", "round_started_at",
+    "guesses", "scores", "last_round_points",
+)
+
+def project_room(room, player_id=None, full: bool = False) -> dict:
+    """What one player is allowed to see of a room.
+
+    The round history is not included (see history_after()). Guessers don't get the current song while a round is running, and nobody sees the
+    other players' guesses before the round result. `full=True` returns the raw room
+    (debugging only, see ROOM_DEBUG_VIEWS).
+    """
+    if full:
+        return dict(room, current_song=CATALOG.song(room.get("current_song_id")),
+                    history=[history_entry_json(e) for e in room.get("history") or []],
+                    available_categories=CATALOG.names)
+    view = {k: room.get(k) for k in PUBLIC_ROOM_FIELDS}
+    view["players"] = [{"id": p.get("id"), "name": p.get("name", "")} for p in room.get("players") or []]
+    view["current_song"] = CATALOG.song(room.get("current_song_id"))
+    view["available_categories"] = CATALOG.names
+    # Round history is fetched incrementally via the `history` action; only announce its size.
+    hist = room.get("history") or []
+    view["history_len"] = len(hist)
+    view["history_last"] = hist[-1].get("round_number", 0) if hist else 0
+    if room.get("status") == "round":
+        if not player_id or player_id != dj_id(room):
+            view["current_song"] = None
+        view["guesses"] = {pid: True for pid in (room.get("guesses") or {})}
+    return view
+
+def room_snapshot(room, player_id=None) -> bytes:
+    """JSON bytes of project_room() for this player, cached until the room version (or the
+    catalog generation) changes.
+
+    A projection only depends on whether the player is the DJ, so all guessers share one
+    encoded snapshot. Call with the room lock held: that makes building single-flight, so
+    concurrent pollers wait for the first one instead of encoding the same room again.
+    """
+    code = room.get("room_code")
+    version = (room.get("version"), CATALOG.gen)
+    view = "dj" if player_id and player_id == dj_id(room) else "player"
+    cached = _room_snapshots.get(code)
+    if not cached or cached[0] != version:
+        cached = (version, {})
+        _room_snapshots[code] = cached
+    body = cached[1].get(view)
+    if body is None:
+        body = json.dumps(project_room(room, player_id), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        cached[1][view] = body
+    return body
+
+def forget_room(code: str):
+    """Remove a room and everything cached for it; wakes its SSE listeners.
+
+    Call with the room lock held.
+    """
+    ROUND_SCHEDULER.cancel(code)
+    with ROOMS_LOCK:
+        rooms.pop(code, None)
+        _room_snapshots.pop(code, None)
+        _room_sizes.pop(code, None)
+        cond = _room_conditions.pop(code, None)
+    if cond is not None:
+        with cond:
+            cond.notify_all()
+
+def _evict_room(code: str, idle_before: Optional[float] = None) -> Optional[int]:
+    """Remove a room for the reaper; returns its serialized size, or None if kept."""
+    with locked_room(code) as room:
+        if room is None:
+            return None
+        if idle_before is not None and rooms.seen_at(code) >= idle_before:
+            return None  # used again since we looked
+        size = len(json.dumps(room))
+        forget_room(code)
+        return size
+
+_room_sizes = {}  # code -> (version, serialized size), for the reaper's memory ceiling
+
+def _room_size(code: str) -> int:
+    """Serialized size of a room, measured under its lock and only again once it changed."""
+    with locked_room(code) as room:
+        if room is None:
+            return 0
+        version = room.get("version")
+        cached = _room_sizes.get(code)
+        if cached is None or cached[0] != version:
+            cached = _room_sizes[code] = (version, len(json.dumps(room)))
+        return cached[1]
+
+def reap_rooms() -> dict:
+    """Evict idle rooms, then enforce the room count and memory ceilings (LRU first)."""
+    evicted = 0
+    reclaimed = 0
+
+    def evict(code, idle_before=None):
+        nonlocal evicted, reclaimed
+        size = _evict_room(code, idle_before)
+        if size is not None:
+            evicted += 1
+            reclaimed += size
+
+    if ROOM_TTL_SECONDS > 0:
+        cutoff = now() - ROOM_TTL_SECONDS
+        for code, seen in rooms.idle_order():
+            if seen >= cutoff:
+                break
+            evict(code, idle_before=cutoff)
+
+    lru = [code for code, _ in rooms.idle_order()]
+    if ROOM_MAX_COUNT > 0 and len(lru) > ROOM_MAX_COUNT:
+        for code in lru[:len(lru) - ROOM_MAX_COUNT]:
+            evict(code)
+        lru = lru[len(lru) - ROOM_MAX_COUNT:]
+
+    if ROOM_MAX_MB > 0:
+        sizes = {code: _room_size(code) for code in lru}
+        total = sum(sizes.values())
+        limit = ROOM_MAX_MB * 1024 * 1024
+        for code in lru:
+            if total <= limit:
+                break
+            evict(code)
+            total -= sizes.get(code, 0)
+
+    sweep_generations()
+
+    if rooms.shared:
+        # Rooms removed by other workers leave their conditions behind here.
+        with ROOMS_LOCK:
+            stale = [code for code in _room_conditions if code not in rooms]
+            for code in stale:
+                _room_conditions.pop(code, None)
+                _room_snapshots.pop(code, None)
+
+    REAPER_STATS["runs"] += 1
+    REAPER_STATS["last_run_at"] = int(now())
+    REAPER_STATS["rooms_evicted"] += evicted
+    REAPER_STATS["bytes_reclaimed"] += reclaimed
+    if evicted:
+        print(f"Room reaper: evicted {evicted} rooms, reclaimed ~{reclaimed} bytes")
+    return {"evicted": evicted, "bytes": reclaimed}
+
+def _room_reaper_loop():
+    while True:
+        time.sleep(ROOM_REAPER_INTERVAL)
+        try:
+            reap_rooms()
+        except Exception as e:
+            print("Room reaper failed:", e)
+
+def start_room_reaper():
+    if ROOM_REAPER_INTERVAL > 0:
+        threading.Thread(target=_room_reaper_loop, name="room-reaper", daemon=True).start()
+
 def record_round_history(room):
     # Create a snapshot for history (song + guesses + points + dj + timestamp)
     players = _players_by_id(room)
     did = dj_id(room)
-    song = deepcopy(room.get("current_song")) if room.get("current_song") else None
 
     guesses_named = []
     for pid, year in (room.get("guesses") or {}).items():
@@ -459,13 +2744,26 @@ def record_round_history(room):
         "ended_at": int(now()),
         "dj_id": did,
         "dj_name": dj_name(room),
-        "song": song,
+        "song_id": room.get("current_song_id"),
         "guesses": guesses_named
     }
     room.setdefault("history", []).append(entry)
 
+def history_after(room, after: int = 0, limit: int = 50):
+    """Return (entries, more) for history entries with round_number > `after`.
+
+    History is append-only with increasing round numbers, so we walk back from the
+    end and only touch the entries the client hasn't seen yet.
+    """
+    hist = room.get("history") or []
+    start = len(hist)
+    while start > 0 and int(hist[start - 1].get("round_number") or 0) > after:
+        start -= 1
+    entries = [history_entry_json(e) for e in hist[start:start + limit]]
+    return entries, start + limit < len(hist)
+
 def end_round(room):
-    correct = int(room["current_song"]["year"])
+    correct = CATALOG.year(room["current_song_id"])
     last_points = {}
 
     for p in room["players"]:
@@ -485,8 +2783,11 @@ def end_round(room):
 
     room["status"] = "round_result"
     room["round_started_at"] = None
+    touch_room(room)
 
 def end_round_if_needed(room):
+    """Lazy timeout check. Only needed with a shared room store, where the worker that
+    armed the round's deadline (RoundScheduler) may have gone away."""
     if not room:
         return
 
@@ -502,6 +2803,68 @@ def end_round_if_needed(room):
 
     end_round(room)
 
+
+class RoundScheduler:
+    """Ends rounds exactly when their timer runs out.
+
+    start_timer arms a deadline per room in a min-heap; a single thread sleeps until
+    the earliest one and calls end_round() under the room lock. Entries are keyed by
+    the round's `round_started_at`, so a round that ended early, was skipped or reset
+    simply doesn't match any more; cancel() also drops it right away.
+    """
+
+    def __init__(self):
+        self._heap = []    # (deadline, code, round_started_at)
+        self._armed = {}   # code -> round_started_at of the armed round
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def arm(self, code: str, round_started_at: float, timer_seconds: float):
+        with self._cond:
+            self._armed[code] = round_started_at
+            heapq.heappush(self._heap, (round_started_at + timer_seconds, code, round_started_at))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="round-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def cancel(self, code: str):
+        with self._cond:
+            self._armed.pop(code, None)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    # Drop cancelled/superseded entries
+                    while self._heap and self._armed.get(self._heap[0][1]) != self._heap[0][2]:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    wait = self._heap[0][0] - now()
+                    if wait <= 0:
+                        _, code, token = heapq.heappop(self._heap)
+                        self._armed.pop(code, None)
+                        break
+                    self._cond.wait(timeout=wait)
+            try:
+                self._fire(code, token)
+            except Exception as e:
+                print("Round scheduler failed:", e)
+
+    def _fire(self, code: str, token: float):
+        with locked_room(code) as room:
+            if not room or room.get("status") != "round" or room.get("round_started_at") != token:
+                return
+            loaded_version = room.get("version")
+            end_round(room)
+            rooms.commit(code, room, loaded_version)
+
+
+ROUND_SCHEDULER = RoundScheduler()
+
+
 @app.route("/")
 def index():
     STATS["visits"] += 1
@@ -526,23 +2889,66 @@ def api():
         device_hash = hashlib.sha256(device_id.encode("utf-8")).hexdigest()[:32]
         DB.register_device(device_hash)
 
+    if action in ROOM_ACTIONS:
+        code = data.get("room")
+        for _ in range(ROOM_STORE_RETRIES):
+            with locked_room(code) as room:
+                if room is None:
+                    if action == "leave_room":
+                        return jsonify({"ok": True})
+                    return jsonify({"error": "room_not_found"}), 400
+                loaded_version = room.get("version")
+                _room_effects.queue = []
+                try:
+                    resp = _api_action(action, data, device_id, room)
+                    committed = rooms.commit(code, room, loaded_version)
+                finally:
+                    effects, _room_effects.queue = _room_effects.queue, None
+                if committed:
+                    for fn, args, kwargs in effects:
+                        fn(*args, **kwargs)
+                    if action != "leave_room" or code in rooms:
+                        rooms.mark_seen(code)
+                    return resp
+        return jsonify({"error": "conflict"}), 409
+    # create_room needs no lock: register_room() claims the code atomically.
+    return _api_action(action, data, device_id)
+
+
+# Actions that operate on an existing room; api() runs them holding that room's lock.
+ROOM_ACTIONS = {
+    "join", "state", "history", "start_game", "start_timer", "skip_song", "submit_guess",
+    "next_round", "reset_game", "set_category", "leave_room",
+}
+
+def _game_completed(game_id: str, fields: dict):
+    STATS["games_completed"] += 1
+    try:
+        DB.bump_daily("games_completed")
+    except Exception as e:
+        print("DB.bump_daily failed:", e)
+    # Persist finished game (best-effort)
+    GAME_SAVES.submit(game_id, **fields)
+
+def _api_action(action: str, data: dict, device_id: str, room: Optional[dict] = None):
     if action == "version":
         return jsonify({"version": VERSION})
 
     if action == "categories":
         # Categories are based solely on the uploaded JSON songset files that exist on the server.
         # (One category per JSON songset file, including the default songs.json)
-        return jsonify({
-            "ok": True,
-            "categories": sorted(list(SONGSETS.keys()))
-        })
+        return Response(CATALOG.categories_json, mimetype="application/json")
 
     if action == "create_room":
+        if data.get("category") and data.get("category") not in CATALOG:
+            return jsonify({"error": "bad_category"}), 400
         room = gen_code()
         pid = gen_id()
         STATS["rooms_created"] += 1
         DB.bump_daily("rooms_created")
-        rooms[room] = {
+        new_room = {
+            # Identifies this room (codes are reused); game_id changes with every game.
+            "room_id": str(uuid.uuid4()),
             "game_id": str(uuid.uuid4()),
             "room_code": room,
             "players": [{"id": pid, "name": data.get("name","") or "Spiller", "device_id": device_id or None}],
@@ -554,9 +2960,11 @@ def api():
             "round_index": 0,
             "rounds_total": int(data.get("rounds", 10)),
             "dj_index": 0,
-            "current_song": None,
+            "current_song_id": None,
             "category": data.get("category") or "Standard",
-            "unused_songs": get_songs_for_category(data.get("category") or "Standard").copy(),
+            "song_pool": new_song_pool(data.get("category") or "Standard"),
+            "song_seed": random.getrandbits(32),
+            "song_draws": 0,
             "guesses": {},
             "scores": {pid: 0},
             "last_round_points": {},
@@ -567,14 +2975,15 @@ def api():
             "created_at": int(time.time()),
             "completed_counted": False,
             "game_started_at": None,
-            "game_ended_at": None
+            "game_ended_at": None,
+            # Monotonic state version; bumped by touch_room() on every mutation.
+            "version": 1
         }
+        while not register_room(room, new_room):
+            room = new_room["room_code"] = gen_code()
         return jsonify({"room": room, "player": {"id": pid}})
 
     if action == "join":
-        room = rooms.get(data.get("room"))
-        if not room:
-            return jsonify({"error": "room_not_found"}), 400
 
         # Ensure newer fields exist for older in-memory rooms.
         room.setdefault("left_players", {})
@@ -586,6 +2995,7 @@ def api():
                     # Treat as reconnect from the same device; don't create a duplicate player.
                     if data.get("name"):
                         p["name"] = data.get("name","") or p.get("name")
+                        touch_room(room)
                     return jsonify({"player": {"id": p["id"], "reconnected": True}})
 
         # If the player previously left, allow re-join without creating a new player.
@@ -607,26 +3017,54 @@ def api():
             room["players"].append({"id": pid, "name": player_name, "device_id": device_id or restored.get("device_id") or None})
             room.setdefault("scores", {}).setdefault(pid, 0)
             room.setdefault("guesses", {}).pop(pid, None)
+            touch_room(room)
             return jsonify({"player": {"id": pid, "rejoined": True}})
 
         pid = gen_id()
         room["players"].append({"id": pid, "name": data.get("name","") or "Spiller", "device_id": device_id or None})
         room["scores"][pid] = 0
         room["last_round_points"][pid] = 0
+        touch_room(room)
         return jsonify({"player": {"id": pid}})
 
     if action == "state":
-        room = rooms.get(data.get("room"))
-        if not room:
-            return jsonify({"error": "room_not_found"}), 400
-        end_round_if_needed(room)
-        room['available_categories'] = sorted(SONGSETS.keys())
-        return jsonify(room)
+        if rooms.shared:
+            end_round_if_needed(room)
+        room.setdefault("version", 1)
+
+        # Conditional polling: the client sends the last version it rendered (`since`)
+        # or an If-None-Match header; answer with a tiny response when nothing changed.
+        full = bool(data.get("full"))
+        if full and not ROOM_DEBUG_VIEWS:
+            return jsonify({"error": "full_view_disabled"}), 403
+        etag = room_etag(room, "full" if full else str(data.get("player") or ""))
+        if request.headers.get("If-None-Match") == etag:
+            return "", 304, {"ETag": etag}
+        since = data.get("since")
+        if since is not None and str(since) == str(room["version"]):
+            resp = jsonify({"ok": True, "unchanged": True, "version": room["version"]})
+        elif full:
+            resp = jsonify(project_room(room, full=True))
+        else:
+            resp = Response(room_snapshot(room, data.get("player")), mimetype="application/json")
+        resp.headers["ETag"] = etag
+        return resp
+
+    if action == "history":
+        try:
+            after = int(data.get("after") or 0)
+            limit = max(1, min(100, int(data.get("limit") or 50)))
+        except Exception:
+            return jsonify({"error": "invalid_cursor"}), 400
+        entries, more = history_after(room, after, limit)
+        return jsonify({
+            "ok": True,
+            "entries": entries,
+            "next": entries[-1].get("round_number", after) if entries else after,
+            "more": more,
+        })
 
     if action == "start_game":
-        room = rooms.get(data.get("room"))
-        if not room:
-            return jsonify({"error": "room_not_found"}), 400
 
         # The host can edit settings inside the room UI before starting.
         # Accept optional overrides here so the selected values are actually used.
@@ -642,13 +3080,10 @@ def api():
             pass
         if data.get("category"):
             new_cat = str(data.get("category"))
-            if new_cat in SONGSETS:
+            if new_cat in CATALOG:
                 if room.get("category") != new_cat:
+                    # draw_song() starts a pool for the new category.
                     room["category"] = new_cat
-                    # Reset pool so we pick from the new category.
-                    room["unused_songs"] = []
-        if not room["unused_songs"]:
-            room["unused_songs"] = get_songs_for_category(room.get("category")).copy()
 
         # Ensure fairness: total rounds should be divisible by number of players,
         # so everyone gets the same number of guesses.
@@ -671,6 +3106,10 @@ def api():
                 adjusted = max(player_count, adjusted)
             room["rounds_total"] = adjusted
 
+        song_id = draw_song(room)
+        if song_id is None:
+            return jsonify({"error": "no_songs"}), 400
+
         room["started"] = True
         room["status"] = "round"
         room["round_index"] = 0
@@ -679,35 +3118,21 @@ def api():
         room["last_round_points"] = {}
         room["history"] = []
         room["round_started_at"] = None
-        room["current_song"] = room["unused_songs"].pop(random.randrange(len(room["unused_songs"])))
+        room["current_song_id"] = song_id
 
-        # persist game start (optional)
-        if not room.get("game_id"):
-            room["game_id"] = str(uuid.uuid4())
+        # persist game start (optional); every game gets its own id, so a game played
+        # after reset_game doesn't collide with the previous one's saved rounds
+        room["game_id"] = str(uuid.uuid4())
+        room["_completed_counted"] = False
         room["game_started_at"] = now()
-        try:
-            # `room_code` is the room identifier sent by the client.
-            room_code = data.get("room")
-            DB.save_game(
-                room.get("game_id") or gen_game_id(),
-                room_code,
-                room.get("category", ""),
-                room.get("rounds_total", 0),
-                # Room setting is stored as `timer_seconds`.
-                room.get("timer_seconds", 0),
-                room.get("players", {}),
-                room.get("history", []),
-            )
-        except Exception as e:
-            app.logger.exception("DB.save_game failed in start_game")
+        room["game_ended_at"] = None
+        after_commit(GAME_SAVES.submit, room["game_id"], **game_save_fields(room))
+        touch_room(room)
         return jsonify({"ok": True})
 
     if action == "start_timer":
-        room = rooms.get(data.get("room"))
-        if not room:
-            return jsonify({"error": "room_not_found"}), 400
         # only allow when a round is active
-        if not room.get("started") or room.get("status") != "round" or not room.get("current_song"):
+        if not room.get("started") or room.get("status") != "round" or room.get("current_song_id") is None:
             return jsonify({"error": "no_active_round"}), 400
         # only DJ can start timer
         pid = data.get("player")
@@ -719,15 +3144,14 @@ def api():
             return jsonify({"error": "not_dj"}), 400
         started_at = now()
         room["round_started_at"] = started_at
+        after_commit(ROUND_SCHEDULER.arm, room["room_code"], started_at, room.get("timer_seconds", 0))
+        touch_room(room)
         return jsonify({"ok": True, "round_started_at": started_at})
 
     if action == "skip_song":
-        room = rooms.get(data.get("room"))
-        if not room:
-            return jsonify({"error": "room_not_found"}), 400
 
         # only allow when a round is active
-        if not room.get("started") or room.get("status") != "round" or not room.get("current_song"):
+        if not room.get("started") or room.get("status") != "round" or room.get("current_song_id") is None:
             return jsonify({"error": "no_active_round"}), 400
 
         # only DJ can skip
@@ -739,48 +3163,17 @@ def api():
         if dj and pid and pid != dj.get("id"):
             return jsonify({"error": "not_dj"}), 400
 
-        # draw a new song from the SAME category
-        cat = room.get("current_song", {}).get("category")
-        # ensure pool exists
-        unused = room.get("unused_songs")
-        if unused is None:
-            unused = []
-            room["unused_songs"] = unused
-        if not unused:
-            room["unused_songs"] = songs.copy()
-            random.shuffle(room["unused_songs"])
-            unused = room["unused_songs"]
-
-        picked = None
-        # try a handful of draws to find matching category
-        for _ in range(len(unused) + 5):
-            if not unused:
-                break
-            candidate = unused.pop()
-            if not cat or candidate.get("category") == cat:
-                picked = candidate
-                break
-            # put back at front if wrong category
-            unused.insert(0, candidate)
-
-        if not picked:
-            # fallback: pick any song
-            if unused:
-                picked = unused.pop()
-            else:
-                picked = random.choice(songs)
-
-        room["current_song"] = picked
+        # draw a new song from the room's category
+        room["current_song_id"] = draw_song(room)
         room["guesses"] = {}
         room["last_round_points"] = {}
         room["round_started_at"] = None
+        after_commit(ROUND_SCHEDULER.cancel, room["room_code"])
+        touch_room(room)
 
-        return jsonify(room)
+        return jsonify(project_room(room, pid))
 
     if action == "submit_guess":
-        room = rooms.get(data.get("room"))
-        if not room:
-            return jsonify({"error": "room_not_found"}), 400
 
         year = data.get("year")
         try:
@@ -799,6 +3192,7 @@ def api():
             return jsonify({"error": "already_guessed"}), 400
 
         room["guesses"][pid] = year
+        touch_room(room)
 
         if all_non_dj_have_guessed(room):
             end_round(room)
@@ -806,100 +3200,61 @@ def api():
         return jsonify({"ok": True})
 
     if action == "next_round":
-        room = rooms.get(data.get("room"))
-        if not room:
-            return jsonify({"error": "room_not_found"}), 400
 
         room["round_index"] += 1
         if room["rounds_total"] and room["round_index"] >= room["rounds_total"]:
             room["status"] = "game_over"
             if not room.get("_completed_counted"):
                 room["_completed_counted"] = True
-                STATS["games_completed"] += 1
-                try:
-                    DB.bump_daily("games_completed")
-                except Exception as e:
-                    print("DB.bump_daily failed:", e)
-                # Persist finished game (best-effort)
                 room["game_ended_at"] = now()
-                try:
-                    DB.save_game(
-                        game_id=room.get("game_id") or str(uuid.uuid4()),
-                        room_code=room.get("room_code"),
-                        started_at=room.get("game_started_at"),
-                        ended_at=room.get("game_ended_at"),
-                        category=room.get("category"),
-                        rounds_total=room.get("rounds_total"),
-                        players=room.get("players"),
-                        history=room.get("history"),
-                    )
-                except Exception as e:
-                    print("DB.save_game failed:", e)
+                after_commit(_game_completed, room.get("game_id") or str(uuid.uuid4()),
+                             game_save_fields(room, ended=True))
+            touch_room(room)
             return jsonify({"ok": True})
 
-        if not room["unused_songs"]:
-            room["unused_songs"] = get_songs_for_category(room.get("category")).copy()
-
         room["dj_index"] = (room["dj_index"] + 1) % len(room["players"])
         room["guesses"] = {}
         room["last_round_points"] = {}
         room["round_started_at"] = None
         room["status"] = "round"
-        room["current_song"] = room["unused_songs"].pop(random.randrange(len(room["unused_songs"])))
+        room["current_song_id"] = draw_song(room)
+        touch_room(room)
         return jsonify({"ok": True})
 
     if action == "reset_game":
-        room = rooms.get(data.get("room"))
-        if not room:
-            return jsonify({"error": "room_not_found"}), 400
         for p in room["players"]:
             room["scores"][p["id"]] = 0
         room["status"] = "lobby"
         room["started"] = False
         room["round_index"] = 0
         room["round_started_at"] = None
-        room["unused_songs"] = get_songs_for_category(room.get("category")).copy()
+        after_commit(ROUND_SCHEDULER.cancel, room["room_code"])
+        room["song_pool"] = new_song_pool(room.get("category"))
         room["guesses"] = {}
         room["last_round_points"] = {}
         room["history"] = []
+        touch_room(room)
         return jsonify({"ok": True})
-    if action == "categories":
-        cats = list(SONGSETS.keys())
-        def sort_key(c: str):
-            if c == "Standard":
-                return (0, 0, c)
-            # decade numbers (e.g. "1990") before other text categories
-            if c.isdigit() and len(c) == 4:
-                return (1, int(c), c)
-            return (2, 0, c)
-        return jsonify({"categories": sorted(cats, key=sort_key)})
-
     if action == "set_category":
-        room = rooms.get(data.get("room"))
-        if not room:
-            return jsonify({"error": "room_not_found"}), 400
         if room.get("started"):
             return jsonify({"error": "already_started"}), 400
         pid = data.get("player")
         if pid != room.get("host_id"):
             return jsonify({"error": "not_host"}), 400
         cat = data.get("category") or "Standard"
-        if cat not in SONGSETS:
+        if cat not in CATALOG:
             return jsonify({"error": "bad_category"}), 400
         room["category"] = cat
-        room["unused_songs"] = get_songs_for_category(cat).copy()
-        room["current_song"] = None
+        room["song_pool"] = new_song_pool(cat)
+        room["current_song_id"] = None
         room["guesses"] = {}
         room["last_round_points"] = {}
+        touch_room(room)
         return jsonify({"ok": True})
 
     if action == "leave_room":
         room_code = data.get("room")
         pid = data.get("player")
-        room = rooms.get(room_code)
-        if not room:
-            return jsonify({"ok": True})
-
         room.setdefault("left_players", {})
 
         # Move the player out of the active list, but keep their id/score so they can re-join
@@ -916,8 +3271,12 @@ def api():
                 "id": pid,
                 "name": leaving_player.get("name", ""),
                 "device_id": leaving_player.get("device_id"),
-                "left_at": now_ts(),
+                "left_at": int(now()),
             }
+            if len(room["left_players"]) > LEFT_PLAYERS_MAX:
+                oldest = sorted(room["left_players"], key=lambda k: room["left_players"][k].get("left_at") or 0)
+                for k in oldest[:len(oldest) - LEFT_PLAYERS_MAX]:
+                    room["left_players"].pop(k, None)
 
         room["players"] = [p for p in room.get("players", []) if p.get("id") != pid]
 
@@ -926,7 +3285,9 @@ def api():
         room.get("last_round_points", {}).pop(pid, None)
 
         if not room["players"]:
-            rooms.pop(room_code, None)
+            # Written (compare-and-swap) first, so a join that raced us wins.
+            touch_room(room)
+            after_commit(forget_room, room_code)
             return jsonify({"ok": True})
 
         if room.get("host_id") == pid:
@@ -939,19 +3300,98 @@ def api():
             room["status"] = "lobby"
             room["started"] = False
             room["round_started_at"] = None
-            room["current_song"] = None
+            room["current_song_id"] = None
             room["guesses"] = {}
             room["last_round_points"] = {}
+            after_commit(ROUND_SCHEDULER.cancel, room_code)
+        elif all_non_dj_have_guessed(room):
+            # The leaver was the last one we were waiting for.
+            end_round(room)
+        touch_room(room)
         return jsonify({"ok": True})
 
     return jsonify({"error": "unknown_action"}), 400
 
 
+def _room_events(code: str, player_id=None, full: bool = False):
+    """Yield an SSE frame with the player's view of the room every time its version changes."""
+    cond = room_condition(code)
+    if cond is None:
+        yield "event: gone\ndata: {}\n\n"
+        return
+    # Rooms are identified by room_id, so a later room reusing the code doesn't leak in.
+    subscribed = (rooms.get(code) or {}).get("room_id")
+    last_version = None
+    last_sent = now()
+    # Shared store: when the loaded round's timer runs out (the room must be loaded to end it).
+    deadline = None
+    while True:
+        payload = None
+        gone = False
+        with cond:
+            if (rooms.shared and last_version is not None and (deadline is None or now() < deadline)
+                    and rooms.version(code) == last_version):
+                # Unchanged by any worker: skip loading and decoding the whole room.
+                rooms.mark_seen(code)
+            else:
+                room = rooms.get(code)
+                if not room or room.get("room_id") != subscribed:
+                    gone = True
+                else:
+                    if rooms.shared:
+                        loaded_version = room.get("version")
+                        end_round_if_needed(room)
+                        rooms.commit(code, room, loaded_version)
+                        started_at = room.get("round_started_at")
+                        deadline = started_at + room["timer_seconds"] if started_at else None
+                    # An open stream keeps the room alive for the reaper.
+                    rooms.mark_seen(code)
+                    if room.get("version") != last_version:
+                        last_version = room.get("version")
+                        if full:
+                            payload = json.dumps(project_room(room, full=True), ensure_ascii=False).encode("utf-8")
+                        else:
+                            payload = room_snapshot(room, player_id)
+        if gone:
+            yield "event: gone\ndata: {}\n\n"
+            return
+        if payload is not None:
+            # Written outside the lock so a slow client never blocks the room.
+            yield f"id: {last_version}\ndata: ".encode("utf-8") + payload + b"\n\n"
+            last_sent = now()
+        elif now() - last_sent >= SSE_KEEPALIVE_SECONDS:
+            yield ": keepalive\n\n"
+            last_sent = now()
+
+        # Sleep until the next mutation (round timeouts come from ROUND_SCHEDULER) or keepalive.
+        timeout = SSE_KEEPALIVE_SECONDS
+        if rooms.poll_interval:
+            timeout = min(timeout, rooms.poll_interval)
+        with cond:
+            if rooms.shared or room.get("version") == last_version:
+                cond.wait(timeout=timeout)
+
+
+@app.route("/api/rooms/<code>/events")
+def room_events(code: str):
+    # Opt-in push alternative to polling the `state` action once per second.
+    if room_condition(code) is None:
+        return jsonify({"error": "room_not_found"}), 404
+    full = request.args.get("full", "").strip().lower() in {"1", "true", "yes"}
+    if full and not ROOM_DEBUG_VIEWS:
+        return jsonify({"error": "full_view_disabled"}), 403
+    return Response(
+        _room_events(code, request.args.get("player"), full=full),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/stats")
 def stats():
     # In-memory "live" state + optional persisted aggregates.
     active_rooms = []
-    for code, r in rooms.items():
+    for code, r in list(rooms.items()):
         active_rooms.append({
             "room": code,
             "players": len(r.get("players") or []),
@@ -965,11 +3405,18 @@ def stats():
     return jsonify({
         "version": VERSION,
         "db_enabled": DB.enabled,
-        "unique_devices": len(STATS["unique_devices"]),
+        "unique_devices": STATS["unique_devices"].count(),
+        "unique_devices_days": DB.device_counts() if DB.enabled else {},
         "rooms_created": STATS["rooms_created"],
         "games_completed": STATS["games_completed"],
         "active_rooms": active_rooms,
         "active_rooms_count": len(active_rooms),
+        "room_reaper": REAPER_STATS,
+        "db_pool": DB.pool_stats(),
+        "db_breaker": DB.breaker_stats() if DB.enabled else None,
+        "boot": dict(BOOT_STATS, songsets=SONGSET_STATS),
+        "device_cache": DB.device_cache.stats(),
+        "game_saves": GAME_SAVES.stats(),
         "daily": DB.daily_metrics(days=30) if DB.enabled else [],
     })
 
@@ -1005,8 +3452,8 @@ def admin_page():
 
   <div class=\"cards\">
     <div class=\"card\"><div class=\"muted\">Version</div><div class=\"kpi\" id=\"v\">…</div></div>
-    <div class=\"card\"><div class=\"muted\">DB</div><div class=\"kpi\" id=\"db\">…</div></div>
-    <div class=\"card\"><div class=\"muted\">Unikke enheder (live)</div><div class=\"kpi\" id=\"u\">…</div></div>
+    <div class=\"card\"><div class=\"muted\">DB</div><div class=\"kpi\" id=\"db\">…</div><div class=\"muted\" id=\"dbs\"></div></div>
+    <div class=\"card\"><div class=\"muted\">Unikke enheder (live)</div><div class=\"kpi\" id=\"u\">…</div><div class=\"muted\" id=\"u730\"></div></div>
     <div class=\"card\"><div class=\"muted\">Aktive rooms</div><div class=\"kpi\" id=\"ar\">…</div></div>
     <div class=\"card\"><div class=\"muted\">Spil gennemført (live)</div><div class=\"kpi\" id=\"gc\">…</div></div>
   </div>
@@ -1033,10 +3480,16 @@ def admin_page():
 
   <h2 style=\"margin-top:18px\">Seneste spil</h2>
   <div class=\"muted\">Klik et spil for at se historik (kun når DB er slået til).</div>
+  <div class=\"row\" style=\"margin-top:8px\">
+    <input id=\"fCategory\" placeholder=\"Kategori\" />
+    <input id=\"fRoom\" placeholder=\"Room\" size=\"6\" />
+    <button id=\"fApply\">Filtrér</button>
+  </div>
   <table style=\"margin-top:8px\">
     <thead><tr><th>Start</th><th>Room</th><th>Kategori</th><th>Runder</th><th>Spillere</th></tr></thead>
     <tbody id=\"games\"></tbody>
   </table>
+  <button id=\"moreGames\" style=\"margin-top:8px;display:none\">Vis flere</button>
 
 <script>
 function svgBarChart(svg, series){
@@ -1063,8 +3516,16 @@ async function tick(){
   const r = await fetch('/admin/api/summary',{cache:'no-store'});
   const s = await r.json();
   document.getElementById('v').textContent = s.version;
-  document.getElementById('db').textContent = s.db_enabled ? 'ON' : 'OFF';
+  const br = s.db_breaker || {};
+  const dbWarming = s.db_enabled && br.state === 'warming';
+  const dbDown = s.db_enabled && br.state && br.state !== 'closed' && !dbWarming;
+  document.getElementById('db').textContent = !s.db_enabled ? 'OFF' : (dbWarming ? 'STARTER' : (dbDown ? 'NEDE' : 'ON'));
+  document.getElementById('dbs').textContent = dbDown
+    ? `Kører i hukommelsen siden ${new Date(br.open_since*1000).toLocaleTimeString()} • bufret: ${br.buffered_metric_days} dage tællere, ${br.buffered_devices} enheder, ${(s.game_saves||{}).pending||0} spil • ${br.last_error||''}`
+    : (s.db_enabled && br.trips ? `Afbrudt ${br.trips} gang(e), sidst: ${br.last_error||''}` : '');
   document.getElementById('u').textContent = s.unique_devices_live;
+  const ud = s.unique_devices_days || {};
+  document.getElementById('u730').textContent = s.db_enabled ? `7 dage: ~${ud['7d']||0} • 30 dage: ~${ud['30d']||0}` : '';
   document.getElementById('ar').textContent = s.active_rooms_count;
   document.getElementById('gc').textContent = s.games_completed_live;
   document.getElementById('chartTag').textContent = s.db_enabled ? 'Persistens' : 'Ingen DB';
@@ -1085,24 +3546,43 @@ async function tick(){
   svgBarChart(document.getElementById('chart'), series);
 }
 
-async function loadGames(){
-  const r = await fetch('/admin/api/games?limit=30',{cache:'no-store'});
+// Games list: keyset pagination ("Vis flere" appends the next page).
+let gamesCursor = null, gamesPages = 0;
+
+async function loadGames(more){
+  const q = new URLSearchParams({limit: '30'});
+  const cat = document.getElementById('fCategory').value.trim();
+  const rc = document.getElementById('fRoom').value.trim();
+  if(cat) q.set('category', cat);
+  if(rc) q.set('room', rc);
+  if(more && gamesCursor) q.set('cursor', gamesCursor);
+  const r = await fetch('/admin/api/games?' + q.toString(),{cache:'no-store'});
   const s = await r.json();
   const tbody = document.getElementById('games');
-  tbody.innerHTML = '';
+  if(!more){
+    tbody.innerHTML = '';
+    gamesPages = 0;
+  }
+  gamesPages += 1;
+  gamesCursor = s.next_cursor || null;
+  document.getElementById('moreGames').style.display = gamesCursor ? '' : 'none';
   for(const g of (s.games||[])){
     const tr = document.createElement('tr');
-    const players = (g.players_display || (g.players||[]).map(p => (typeof p === 'string') ? p : (p?.name || p?.player || p?.username || '')).filter(Boolean).join(', '));
+    const players = g.players_display || '';
     const href = g.id ? `/admin/game/${g.id}` : '#';
     tr.innerHTML = `<td><a href='${href}'>${g.started_at||''}</a></td><td>${g.room||g.room_code||''}</td><td>${g.category||''}</td><td>${g.rounds_total||''}</td><td>${players}</td>`;
     tbody.appendChild(tr);
   }
 }
 
+document.getElementById('moreGames').onclick = () => loadGames(true);
+document.getElementById('fApply').onclick = () => loadGames(false);
+
 tick();
-loadGames();
+loadGames(false);
 setInterval(tick, 5000);
-setInterval(loadGames, 15000);
+// Only auto-refresh while the admin is looking at the first page.
+setInterval(() => { if(gamesPages <= 1) loadGames(false); }, 15000);
 </script>
 </body>
 </html>"""
@@ -1112,7 +3592,7 @@ setInterval(loadGames, 15000);
 def admin_api_summary():
     # Live state
     active = []
-    for rc, room in rooms.items():
+    for rc, room in list(rooms.items()):
         active.append({
             "room": rc,
             "players": len(room.get("players", [])),
@@ -1127,51 +3607,75 @@ def admin_api_summary():
     return jsonify({
         "version": VERSION,
         "db_enabled": DB.enabled,
-        "unique_devices_live": len(STATS["unique_devices"]),
+        "unique_devices_live": STATS["unique_devices"].count(),
+        "unique_devices_days": DB.device_counts() if DB.enabled else {},
         "games_completed_live": STATS["games_completed"],
         "active_rooms_count": len(rooms),
         "active_rooms": active,
+        "room_reaper": REAPER_STATS,
+        "db_pool": DB.pool_stats(),
+        "db_breaker": DB.breaker_stats() if DB.enabled else None,
+        "boot": dict(BOOT_STATS, songsets=SONGSET_STATS),
+        "device_cache": DB.device_cache.stats(),
+        "game_saves": GAME_SAVES.stats(),
         "daily": daily,
     })
 
 
+def _int_arg(name: str, default: int, lo: int, hi: int) -> int:
+    """Integer query parameter clamped to [lo, hi]; missing or malformed gives the default."""
+    try:
+        value = int(request.args.get(name) or default)
+    except ValueError:
+        value = default
+    return max(lo, min(hi, value))
+
+
 @app.route("/admin/api/games")
 def admin_api_games():
-    limit = int(request.args.get("limit", "30") or 30)
-    limit = max(1, min(200, limit))
+    limit = _int_arg("limit", 30, 1, 200)
     if not DB.enabled:
-        return jsonify({"games": []})
-
-    games = DB.recent_games(limit=limit)
-
-    # Normalize players for admin list view:
-    # - DB may store players as list of dicts (e.g. {"name": "..."}), which would render as [object Object] in JS.
-    # - Return both a string list and a ready-to-display string.
-    for g in games:
-        players = g.get("players")
-        names = []
-        if isinstance(players, list):
-            for p in players:
-                if isinstance(p, str):
-                    names.append(p)
-                elif isinstance(p, dict):
-                    n = p.get("name") or p.get("player") or p.get("username") or p.get("display_name") or p.get("id")
-                    if n is not None:
-                        names.append(str(n))
-                elif p is not None:
-                    names.append(str(p))
-        elif isinstance(players, dict):
-            n = players.get("name") or players.get("player") or players.get("username") or players.get("display_name") or players.get("id")
-            if n is not None:
-                names.append(str(n))
-        elif isinstance(players, str) and players.strip():
-            # Already a display string in some older records
-            names = [s.strip() for s in players.split(",") if s.strip()]
-
-        g["players"] = names
-        g["players_display"] = ", ".join([n for n in names if n])
-
-    return jsonify({"games": games})
+        return jsonify({"games": [], "next_cursor": None})
+
+    cursor = request.args.get("cursor") or None
+    if cursor:
+        try:
+            DB.parse_cursor(cursor)
+        except ValueError:
+            return jsonify({"error": "bad_cursor"}), 400
+    games = DB.recent_games(
+        limit=limit,
+        cursor=cursor,
+        category=request.args.get("category") or None,
+        room_code=(request.args.get("room") or "").strip().upper() or None,
+    )
+    # players_display is computed when the game is saved; no JSONB parsing here.
+    next_cursor = games[-1]["cursor"] if len(games) == limit else None
+    return jsonify({"games": games, "next_cursor": next_cursor})
+
+@app.route("/admin/api/songs")
+def admin_api_songs():
+    # Per-song accuracy, e.g. ?order=easiest&category=dansk&min_guesses=10
+    try:
+        songs = DB.breaker.call(
+            DB.song_accuracy,
+            category=request.args.get("category") or None,
+            min_guesses=_int_arg("min_guesses", 5, 1, 1_000_000),
+            hardest=request.args.get("order", "hardest") != "easiest",
+            limit=_int_arg("limit", 50, 1, 500),
+        )
+    except DbUnavailable:
+        return jsonify({"error": "db_unavailable", "songs": []}), 503
+    return jsonify({"songs": songs})
+
+
+@app.route("/admin/api/categories")
+def admin_api_categories():
+    # Per-category difficulty
+    try:
+        return jsonify({"categories": DB.breaker.call(DB.category_difficulty)})
+    except DbUnavailable:
+        return jsonify({"error": "db_unavailable", "categories": []}), 503
 
 @app.route("/admin/game/<game_id>")
 def admin_game_detail(game_id: str):
@@ -1343,4 +3847,24 @@ def admin_game_detail(game_id: str):
   <h2>Historik</h2>
   {history_html}
 </body>
-</html>"""
\ No newline at end of file
+</html>"""
+
+
+start_room_reaper()
+start_songset_watcher()
+
+
+@app.before_request
+def _note_first_request():
+    if BOOT_STATS["first_request_ms"] is None:
+        BOOT_STATS["first_request_ms"] = round((time.perf_counter() - BOOT_STARTED) * 1000, 1)
+        print(f"First request {BOOT_STATS['first_request_ms']:.0f} ms after start")
+
+
+BOOT_STATS["ready_ms"] = round((time.perf_counter() - BOOT_STARTED) * 1000, 1)
+print(f"Ready to serve after {BOOT_STATS['ready_ms']:.0f} ms "
+      f"({len(CATALOG.names)} categories indexed, {len(CATALOG.pending)} not parsed yet)")
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", PORT)), threaded=True)
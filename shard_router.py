@@ -0,0 +1,281 @@
+"""Room-code sharding: K server.py worker processes behind a small forwarding router.
+
+Each worker owns the rooms whose code hashes to its shard (see shard_for()); rooms stay
+purely in that worker's memory and need no cross-process locking. The router forwards
+`/api` calls by their `room` field and spreads the room-less actions (`create_room`,
+`version`, `categories`) round-robin; a worker only generates codes it owns itself.
+
+    python shard_router.py --workers 4              # serve on PORT (default 8787)
+    python shard_router.py --workers 4 --routers 2  # two router processes on the same port
+    python shard_router.py --bench --workers 4      # throughput for 1..4 workers
+
+Workers run under gunicorn (one process with threads each) when it is installed. One
+router process tops out well below what the workers can serve, so --routers starts
+several that share the port via SO_REUSEPORT (Linux).
+
+The admin pages (/admin, /stats) are served by worker 0 and only show its live rooms.
+"""
+import argparse
+import http.client
+import importlib.util
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+from flask import Flask, Response, request
+from werkzeug.serving import make_server
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HAVE_GUNICORN = importlib.util.find_spec("gunicorn") is not None
+# Threads per worker; every open SSE stream holds one.
+WORKER_THREADS = int(os.getenv("SHARD_WORKER_THREADS", "32") or 32)
+
+
+def shard_for(code: str, count: int) -> int:
+    """Stable shard index of a room code (same in every process, unlike hash())."""
+    if count <= 1:
+        return 0
+    return zlib.crc32((code or "").upper().encode("utf-8")) % count
+
+
+def worker_command(port: int) -> list:
+    """A shard's server: gunicorn with one process (the shard's rooms live in its memory)
+    and threads, or the Flask development server if gunicorn isn't installed."""
+    if not HAVE_GUNICORN:
+        return [sys.executable, "server.py"]
+    return [sys.executable, "-m", "gunicorn", "-w", "1", "-k", "gthread", "--threads", str(WORKER_THREADS),
+            "-b", f"127.0.0.1:{port}", "server:app"]
+
+
+def start_workers(count: int, base_port: int) -> list:
+    procs = []
+    for i in range(count):
+        env = dict(os.environ, PORT=str(base_port + i), SHARD_INDEX=str(i), SHARD_COUNT=str(count))
+        procs.append(subprocess.Popen(worker_command(base_port + i), cwd=HERE, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    for i in range(count):
+        _wait_for_port(base_port + i)
+    return procs
+
+
+def stop_workers(procs: list):
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        try:
+            p.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+
+def _wait_for_port(port: int, timeout: float = 20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            c = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            c.request("POST", "/api", body=b'{"action":"version"}', headers={"Content-Type": "application/json"})
+            c.getresponse().read()
+            c.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"worker on port {port} did not start")
+
+
+def make_router(worker_ports: list) -> Flask:
+    router = Flask(__name__, static_folder=None)
+    count = len(worker_ports)
+    round_robin = itertools.count()
+    local = threading.local()
+
+    def conn(shard: int) -> http.client.HTTPConnection:
+        # One keep-alive connection per router thread and worker.
+        conns = getattr(local, "conns", None)
+        if conns is None:
+            conns = local.conns = {}
+        c = conns.get(shard)
+        if c is None:
+            c = conns[shard] = http.client.HTTPConnection("127.0.0.1", worker_ports[shard], timeout=30)
+        return c
+
+    def forward(shard: int, method: str, path: str, body: bytes = None) -> Response:
+        headers = {k: v for k, v in request.headers.items() if k.lower() in {"content-type", "if-none-match"}}
+        for attempt in range(2):
+            c = conn(shard)
+            try:
+                c.request(method, path, body=body, headers=headers)
+                r = c.getresponse()
+                data = r.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # Stale keep-alive connection; reconnect once.
+                c.close()
+                local.conns.pop(shard, None)
+                if attempt:
+                    return Response('{"error":"shard_unavailable"}', status=502, mimetype="application/json")
+        out = {k: v for k, v in r.getheaders() if k.lower() in {"content-type", "etag"}}
+        return Response(data, status=r.status, headers=out)
+
+    @router.route("/api", methods=["POST"])
+    def api():
+        body = request.get_data()
+        try:
+            code = (json.loads(body or b"{}") or {}).get("room")
+        except ValueError:
+            code = None
+        shard = shard_for(code, count) if code else next(round_robin) % count
+        return forward(shard, "POST", "/api", body)
+
+    @router.route("/api/rooms/<code>/events")
+    def room_events(code: str):
+        # Long-lived stream: own connection, relayed chunk by chunk.
+        c = http.client.HTTPConnection("127.0.0.1", worker_ports[shard_for(code, count)], timeout=None)
+        c.request("GET", request.full_path)
+        r = c.getresponse()
+
+        def relay():
+            try:
+                while True:
+                    chunk = r.read1(65536)
+                    if not chunk:
+                        return
+                    yield chunk
+            finally:
+                c.close()
+
+        return Response(relay(), status=r.status, mimetype=r.getheader("Content-Type"),
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @router.route("/", defaults={"path": ""})
+    @router.route("/<path:path>")
+    def other(path: str):
+        # Static files and admin pages; admin/stats always come from worker 0.
+        shard = 0 if path.startswith(("admin", "stats")) else next(round_robin) % count
+        return forward(shard, "GET", request.full_path if request.query_string else request.path)
+
+    return router
+
+
+def serve_router(port: int, worker_ports: list, reuse_port: bool = False, host: str = "0.0.0.0"):
+    """Run one router process; with reuse_port several can listen on the same port and
+    the kernel spreads connections between them."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    make_server(host, port, make_router(worker_ports), threaded=True, fd=sock.fileno()).serve_forever()
+
+
+def start_routers(count: int, port: int, worker_ports: list, host: str = "0.0.0.0") -> list:
+    if count > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        raise SystemExit("--routers > 1 needs SO_REUSEPORT (Linux); use nginx in front instead")
+    procs = [multiprocessing.Process(target=serve_router, args=(port, worker_ports, count > 1, host), daemon=True)
+             for _ in range(count)]
+    for p in procs:
+        p.start()
+    return procs
+
+
+def stop_routers(procs: list):
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        p.join(timeout=5)
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+
+def _bench_client(args):
+    """Poll `state` for a set of rooms as fast as possible; return requests done."""
+    targets, duration = args
+    conns = {}
+    done = 0
+    deadline = time.time() + duration
+    cycle = itertools.cycle(targets)
+    while time.time() < deadline:
+        port, code = next(cycle)
+        c = conns.get(port)
+        if c is None:
+            c = conns[port] = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        c.request("POST", "/api", body=json.dumps({"action": "state", "room": code}),
+                  headers={"Content-Type": "application/json"})
+        c.getresponse().read()
+        done += 1
+    return done
+
+
+def bench(max_workers: int, base_port: int, rooms_per_worker: int = 20, clients: int = 0, duration: float = 3.0,
+          routers: int = 1):
+    """Measure state-poll throughput for 1..max_workers shards, via the router(s) and direct."""
+    clients = clients or max(2, (os.cpu_count() or 2))
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    print(f"{'workers':>7} {'direct req/s':>13} {'router req/s':>13}")
+    for k in range(1, max_workers + 1):
+        ports = [base_port + 1 + i for i in range(k)]
+        procs = start_workers(k, ports[0])
+        router_port = base_port
+        routers_procs = start_routers(routers, router_port, ports, host="127.0.0.1")
+        try:
+            _wait_for_port(router_port)
+            codes = []
+            rc = http.client.HTTPConnection("127.0.0.1", router_port, timeout=10)
+            for _ in range(rooms_per_worker * k):
+                rc.request("POST", "/api", body=b'{"action":"create_room","name":"bench"}',
+                           headers={"Content-Type": "application/json"})
+                codes.append(json.loads(rc.getresponse().read())["room"])
+            rc.close()
+            direct = [(ports[shard_for(c, k)], c) for c in codes]
+            routed = [(router_port, c) for c in codes]
+            results = []
+            with multiprocessing.Pool(clients) as pool:
+                for targets in (direct, routed):
+                    jobs = [(targets[i::clients] or targets, duration) for i in range(clients)]
+                    results.append(sum(pool.map(_bench_client, jobs)) / duration)
+            print(f"{k:>7} {results[0]:>13.0f} {results[1]:>13.0f}")
+        finally:
+            stop_routers(routers_procs)
+            stop_workers(procs)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", "8787")))
+    ap.add_argument("--routers", type=int, default=1, help="router processes sharing the port (SO_REUSEPORT)")
+    ap.add_argument("--bench", action="store_true", help="run the scaling benchmark and exit")
+    ap.add_argument("--duration", type=float, default=3.0, help="seconds per benchmark run")
+    args = ap.parse_args()
+
+    if not HAVE_GUNICORN:
+        print("gunicorn is not installed; workers run on the Flask development server")
+    if args.bench:
+        bench(args.workers, args.port + 100, duration=args.duration, routers=args.routers)
+        return
+
+    ports = [args.port + 1 + i for i in range(args.workers)]
+    procs = start_workers(args.workers, ports[0])
+    routers = start_routers(args.routers, args.port, ports)
+    try:
+        print(f"{args.routers} router(s) on :{args.port} -> {args.workers} workers on :{ports[0]}-{ports[-1]}")
+        for p in routers:
+            p.join()
+    finally:
+        stop_routers(routers)
+        stop_workers(procs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""Songset compiler: check every song file, dedupe the songs and write a compiled catalog.
+
+    python songset_compiler.py               # check all song files, write songs.catalog
+    python songset_compiler.py --check       # only report problems
+    python songset_compiler.py -o x.catalog songs_1.json   # other extra files to check
+
+Categories follow the server's layout (web/songs.json is Standard, web/songs_<name>.json
+the rest). The other copies (songs_1.json, web/web/, musik_spil_1_4_40/web/) are checked
+against them too, but are not compiled. Songs are the same song when title and artist
+match (ignoring case and spacing); if two entries disagree on year or link, the first
+one in category order wins and the difference is reported. On invalid songs or year
+conflicts it exits with 1 and leaves the existing catalog alone.
+
+The compiled file is fixed-width and little-endian, so server.py maps it with mmap and
+reads the columns in place (see CompiledCatalog) instead of parsing JSON at startup:
+
+    header   magic, then version, songs, strings, categories, category ids (uint32)
+    uint32   string offsets into the blob (strings + 1); string 0 is ""
+    uint32   title, artist and link string of each song (link 0 = none)
+    int16    year of each song (padded to 4 bytes)
+    uint32   name string of each category, start of each category in the ids (+ 1)
+    uint32   category ids
+    bytes    string blob (UTF-8)
+"""
+import argparse
+import glob
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import date
+from typing import Iterator, Optional
+
+MAGIC = b"SONGCAT1"
+VERSION = 1
+HEADER = struct.Struct("<8s5I")
+YEAR_MIN = 1800
+EXTRA_SOURCES = ["songs_1.json", "web/web/songs*.json", "musik_spil_1_4_40/web/songs*.json"]
+SONG_FIELDS = {"title", "artist", "year", "spotifyUrl"}
+
+
+def songset_paths(root: str = "") -> dict:
+    """Category name -> file: web/songs.json is Standard, web/songs_<name>.json the rest."""
+    paths = {"Standard": os.path.join(root, "web", "songs.json")}
+    # Sorted, so every worker assigns the same song ids
+    for path in sorted(glob.glob(os.path.join(root, "web", "songs_*.json"))):
+        name = os.path.basename(path)
+        # songs_Danske 1960 til 2025.json -> Danske 1960 til 2025
+        cat = name[len("songs_"):-len(".json")]
+        cat = cat.replace("_", " ").strip()
+        if cat:
+            paths[cat] = path
+    return paths
+
+
+def iter_json_list(path: str, chunk_size: int = 1 << 16) -> Iterator:
+    """Yield the items of a file holding a JSON list one by one, reading it in chunks."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buf, pos, eof = "", 0, False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+
+        def peek() -> str:
+            # Next non-blank character, or "" at the end of the file.
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return buf[pos:pos + 1]
+                fill()
+
+        if peek() != "[":
+            raise ValueError("not a JSON list")
+        pos += 1
+        if peek() == "]":
+            return
+        for i in itertools.count():
+            peek()
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    fill()
+                    continue
+                if end == len(buf) and not eof:
+                    fill()  # a number may go on in the next chunk
+                    continue
+                break
+            pos = end
+            yield item
+            nxt = peek()
+            if nxt == "]":
+                return
+            if nxt != ",":
+                raise ValueError(f"expected ',' or ']' after item #{i}")
+            pos += 1
+
+
+def song_key(title: str, artist: str) -> tuple:
+    return (" ".join(title.split()).casefold(), " ".join(artist.split()).casefold())
+
+
+def check_song(s) -> tuple:
+    """(song or None, problems): song is (title, artist, year, url); None means skip it."""
+    if not isinstance(s, dict):
+        return None, [f"not an object: {s!r}"]
+    problems = []
+    title, artist, year, url = s.get("title"), s.get("artist"), s.get("year"), s.get("spotifyUrl")
+    if not isinstance(title, str) or not title.strip():
+        return None, [f"missing title: {s!r}"]
+    if isinstance(year, str) and year.strip().isdigit():
+        year = int(year)
+    if isinstance(year, bool) or not isinstance(year, int):
+        return None, [f"year {year!r} is not a whole number ({title!r})"]
+    if not YEAR_MIN <= year <= date.today().year + 1:
+        return None, [f"year {year} is out of range ({title!r})"]
+    if not isinstance(artist, str) or not artist.strip():
+        problems.append(f"missing artist ({title!r})")
+        artist = ""
+    if url is not None and not (isinstance(url, str) and url.startswith("https://")):
+        problems.append(f"link {url!r} dropped ({title!r})")
+        url = None
+    unknown = sorted(set(s) - SONG_FIELDS)
+    if unknown:
+        problems.append(f"unknown fields {', '.join(unknown)} ({title!r})")
+    return (" ".join(title.split()), " ".join(artist.split()), year, url or None), problems
+
+
+class Compiler:
+    """Collects songs from the category files, then checks the extra files against them."""
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.songs = []        # id -> (title, artist, year, url)
+        self.where = []        # id -> "file #index" of the entry that won
+        self.by_key = {}       # song_key -> id
+        self.categories = {}   # name -> [ids]
+        self.stats = {"files": 0, "entries": 0, "invalid": 0, "warnings": 0, "conflicts": 0,
+                      "duplicates": 0, "not_served": 0}
+
+    def report(self, msg: str):
+        print(msg, file=self.out)
+
+    def add_file(self, path: str, category: Optional[str] = None):
+        """Read one file; songs go into `category`, or are only checked if it is None."""
+        self.stats["files"] += 1
+        seen = {}   # song_key -> index in this file
+        ids = []
+        not_served = 0
+        try:
+            for i, s in enumerate(iter_json_list(path)):
+                self.stats["entries"] += 1
+                where = f"{path} #{i}"
+                song, problems = check_song(s)
+                for p in problems:
+                    self.report(f"{where}: {p}" + ("" if song else " - skipped"))
+                if song is None:
+                    self.stats["invalid"] += 1
+                    continue
+                self.stats["warnings"] += len(problems)
+                key = song_key(song[0], song[1])
+                if key in seen:
+                    self.stats["duplicates"] += 1
+                    self.report(f"{where}: {song[0]!r} / {song[1]!r} is already #{seen[key]} in this file")
+                    continue
+                seen[key] = i
+                sid = self.by_key.get(key)
+                if sid is None:
+                    if category is None:
+                        not_served += 1
+                        continue
+                    sid = self.by_key[key] = len(self.songs)
+                    self.songs.append(song)
+                    self.where.append(where)
+                else:
+                    self._compare(sid, song, where)
+                ids.append(sid)
+        except (OSError, ValueError) as e:
+            self.stats["invalid"] += 1
+            self.report(f"{path}: {e}")
+        if category is not None:
+            self.categories[category] = ids
+        elif not_served:
+            self.stats["not_served"] += not_served
+            self.report(f"{path}: {not_served} songs are not in any category")
+
+    def _compare(self, sid: int, song: tuple, where: str):
+        kept = self.songs[sid]
+        diffs = [f"{field} {new!r} vs {old!r}" for field, new, old in
+                 (("year", song[2], kept[2]), ("link", song[3], kept[3])) if new != old]
+        if diffs:
+            # Only the year is scored; a different link is just a warning.
+            self.stats["conflicts" if song[2] != kept[2] else "warnings"] += 1
+            self.report(f"{where}: conflicts with {self.where[sid]} for {kept[0]!r} / {kept[1]!r}: "
+                        + ", ".join(diffs) + " (keeping the first)")
+
+    def write(self, path: str) -> int:
+        """Write the compiled catalog atomically; returns its size in bytes."""
+        strings = {"": 0}
+
+        def ref(s: Optional[str]) -> int:
+            return strings.setdefault(s, len(strings)) if s else 0
+
+        titles = array("I", (ref(s[0]) for s in self.songs))
+        artists = array("I", (ref(s[1]) for s in self.songs))
+        urls = array("I", (ref(s[3]) for s in self.songs))
+        years = array("h", (s[2] for s in self.songs))
+        if len(years) % 2:
+            years.append(0)
+        names = array("I", (ref(name) for name in self.categories))
+        starts = array("I", [0])
+        ids = array("I")
+        for cat_ids in self.categories.values():
+            ids.extend(cat_ids)
+            starts.append(len(ids))
+        blob = bytearray()
+        offsets = array("I", [0])
+        for s in strings:  # insertion order == string index
+            blob += s.encode("utf-8")
+            offsets.append(len(blob))
+        sections = [offsets, titles, artists, urls, years, names, starts, ids]
+        if sys.byteorder != "little":
+            for a in sections:
+                a.byteswap()
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, len(self.songs), len(strings), len(self.categories), len(ids)))
+                for a in sections:
+                    f.write(a.tobytes())
+                f.write(blob)
+                size = f.tell()
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return size
+
+
+class CompiledCatalog:
+    """A compiled catalog, mapped read-only; strings are decoded on access.
+
+    `years` is a memoryview of int16 and each value of `categories` a memoryview of
+    song ids (uint32), both pointing into the mapped file.
+    """
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little" or array("I").itemsize != 4:
+            raise ValueError("compiled catalogs need a little-endian platform with 32-bit ints")
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        if len(view) < HEADER.size or bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("not a compiled catalog")
+        _, version, n, n_strings, n_cats, n_ids = HEADER.unpack_from(view)
+        if version != VERSION:
+            raise ValueError(f"compiled catalog version {version}, expected {VERSION}")
+        pos = HEADER.size
+        if len(view) < pos + 4 * (n_strings + 3 * n + 2 * n_cats + n_ids + 2) + 2 * (n + n % 2):
+            raise ValueError("truncated compiled catalog")
+
+        def take(count: int, fmt: str, width: int) -> memoryview:
+            nonlocal pos
+            part = view[pos:pos + count * width].cast(fmt)
+            pos += count * width
+            return part
+
+        self._offsets = take(n_strings + 1, "I", 4)
+        self._titles = take(n, "I", 4)
+        self._artists = take(n, "I", 4)
+        self._urls = take(n, "I", 4)
+        self.years = take(n, "h", 2)
+        pos += (n % 2) * 2
+        names = take(n_cats, "I", 4)
+        starts = take(n_cats + 1, "I", 4)
+        ids = take(n_ids, "I", 4)
+        self._blob = view[pos:]
+        if len(self._blob) != self._offsets[-1]:
+            raise ValueError("truncated compiled catalog")
+        self.count = n
+        self.categories = {self.string(names[i]): ids[starts[i]:starts[i + 1]] for i in range(n_cats)}
+
+    def string(self, ref: int) -> str:
+        return str(self._blob[self._offsets[ref]:self._offsets[ref + 1]], "utf-8")
+
+    def title(self, sid: int) -> str:
+        return self.string(self._titles[sid])
+
+    def artist(self, sid: int) -> str:
+        return self.string(self._artists[sid])
+
+    def url(self, sid: int) -> Optional[str]:
+        return self.string(self._urls[sid]) or None
+
+    def rows(self, category: str) -> list:
+        """[(title, artist, year, url)] of a category, as server.SongCatalog.add_category takes them."""
+        return [(self.title(sid), self.artist(sid), self.years[sid], self.url(sid))
+                for sid in self.categories[category]]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("extra", nargs="*", help=f"other song files to check (default: {' '.join(EXTRA_SOURCES)})")
+    ap.add_argument("-o", "--output", default=os.getenv("SONGSET_CATALOG") or "songs.catalog")
+    ap.add_argument("--check", action="store_true", help="only validate, do not write the catalog")
+    args = ap.parse_args()
+
+    compiler = Compiler()
+    for cat, path in songset_paths().items():
+        compiler.add_file(path, cat)
+    extras = args.extra or [p for pattern in EXTRA_SOURCES for p in sorted(glob.glob(pattern))]
+    for path in extras:
+        compiler.add_file(path)
+
+    st = compiler.stats
+    print(f"{st['files']} files, {st['entries']} entries: {len(compiler.songs)} songs in "
+          f"{len(compiler.categories)} categories, {st['invalid']} invalid, {st['warnings']} warnings, "
+          f"{st['conflicts']} conflicts, {st['duplicates']} duplicates, {st['not_served']} not served")
+    failed = bool(st["invalid"] or st["conflicts"])
+    if failed and not args.check:
+        # The server maps (and hot-reloads) this file, so keep the last good one.
+        print(f"Not writing {args.output}: fix the invalid songs and conflicts above")
+    elif not args.check:
+        size = compiler.write(args.output)
+        print(f"Wrote {args.output} ({size} bytes)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
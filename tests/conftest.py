@@ -0,0 +1,12 @@
+"""Environment for the tests (python -m pytest tests): a throwaway SQLite DB and the
+repo's JSON songsets, read relative to the repo root."""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "games.db")
+os.environ["SONGSET_CATALOG"] = ""
+os.environ["SONGSET_CACHE_DIR"] = ""
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
@@ -0,0 +1,42 @@
+"""DB circuit breaker: opens after repeated database errors, closes after a good probe."""
+import sqlite3
+
+import pytest
+
+import server
+
+
+def _fail():
+    raise sqlite3.OperationalError("database is locked")
+
+
+def _bad_input():
+    raise sqlite3.IntegrityError("UNIQUE constraint failed")
+
+
+def test_breaker_opens_after_failures_and_closes_after_probe():
+    breaker = server.CircuitBreaker(failures=3, slow=10, cooldown=0)
+    for _ in range(2):
+        with pytest.raises(sqlite3.OperationalError):
+            breaker.call(_fail)
+    assert breaker.state == "closed"
+    with pytest.raises(sqlite3.OperationalError):
+        breaker.call(_fail)
+    assert breaker.state == "open"
+    with pytest.raises(server.DbUnavailable):
+        breaker.call(lambda: 1)
+
+    assert not breaker.probe(_fail)
+    assert breaker.state == "open"
+    assert breaker.probe(lambda: None)
+    assert breaker.state == "closed"
+    assert breaker.call(lambda: 1) == 1
+
+
+def test_breaker_ignores_non_database_errors():
+    breaker = server.CircuitBreaker(failures=1, slow=10, cooldown=0)
+    with pytest.raises(sqlite3.IntegrityError):
+        breaker.call(_bad_input)
+    with pytest.raises(KeyError):
+        breaker.call({}.__getitem__, "x")
+    assert breaker.state == "closed"
@@ -0,0 +1,63 @@
+"""Song catalog: loading songsets and keeping the song columns aligned."""
+import json
+import os
+
+import pytest
+
+import server
+
+
+def _columns(catalog):
+    return len(catalog.titles), len(catalog.artists), len(catalog.years), len(catalog.urls)
+
+
+def test_songset_rows_skip_invalid_songs(tmp_path):
+    path = tmp_path / "songs_x.json"
+    path.write_text(json.dumps([
+        {"title": "Big", "artist": "X", "year": 198450},
+        {"title": "", "artist": "X", "year": 1990},
+        {"title": "Word", "artist": "X", "year": "nineteen"},
+        {"title": "Ok", "artist": "Y", "year": "1990"},
+    ]))
+    with server._songset_lock:
+        assert server._songset_rows(str(path)) == [("Ok", "Y", 1990, None)]
+
+
+def test_rejected_row_leaves_columns_aligned():
+    catalog = server.SongCatalog()
+    catalog.add_category("a", [("One", "X", 1963, "https://a")])
+    with pytest.raises(OverflowError):
+        catalog.add_category("b", [("Two", "Y", 99999, "https://b")])
+    assert _columns(catalog) == (1, 1, 1, 1)
+    catalog.add_category("c", [("Three", "Z", 1975, None)])
+    assert catalog.song(catalog.ids("c")[0]) == {"year": 1975, "title": "Three", "artist": "Z"}
+    assert catalog.song(catalog.ids("a")[0])["year"] == 1963
+
+
+def test_broken_songset_is_not_offered(tmp_path):
+    broken = tmp_path / "songs_broken.json"
+    broken.write_text("[{")
+    catalog = server.SongCatalog()
+    catalog.add_category("Standard", [("One", "X", 1963, None)])
+    catalog.pending["broken"] = str(broken)
+    catalog.freeze()
+    assert "broken" in catalog.names
+    assert "broken" not in catalog
+    assert "broken" not in catalog.names
+    assert b"broken" not in catalog.categories_json
+
+
+def test_room_with_broken_category_is_rejected():
+    path = "web/songs_zz_test_broken.json"
+    with open(path, "w") as f:
+        f.write("[{")
+    try:
+        server.reload_songsets()
+        assert "zz test broken" in server.CATALOG.names
+        client = server.app.test_client()
+        r = client.post("/api", json={"action": "create_room", "name": "A", "category": "zz test broken"})
+        assert r.status_code == 400 and r.get_json()["error"] == "bad_category"
+        assert "zz test broken" not in server.CATALOG.names
+    finally:
+        os.remove(path)
+        server.reload_songsets()
@@ -0,0 +1,68 @@
+"""Two games in the same room must be saved as two games (python -m pytest tests)."""
+import time
+
+import server
+
+
+def _wait(cond, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cond():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _api(client, **data):
+    r = client.post("/api", json=data)
+    assert r.status_code == 200, r.get_json()
+    return r.get_json()
+
+
+def _play_game(client, code, players):
+    _api(client, action="start_game", room=code, player=players[0])
+    room = server.rooms[code]
+    game_id = room["game_id"]
+    for _ in range(room["rounds_total"]):
+        dj = server.dj_id(server.rooms[code])
+        for pid in players:
+            if pid != dj:
+                _api(client, action="submit_guess", room=code, player=pid, year=1970)
+        _api(client, action="next_round", room=code, player=dj)
+    assert server.rooms[code]["status"] == "game_over"
+    return game_id
+
+
+def test_second_game_in_room_gets_its_own_rounds():
+    assert _wait(lambda: server.DB.breaker.state == "closed")
+    client = server.app.test_client()
+    created = _api(client, action="create_room", name="A", rounds=2)
+    code, a = created["room"], created["player"]["id"]
+    b = _api(client, action="join", room=code, name="B")["player"]["id"]
+
+    first = _play_game(client, code, [a, b])
+    _api(client, action="reset_game", room=code, player=a)
+    second = _play_game(client, code, [a, b])
+    assert first != second
+
+    def saved_rounds():
+        rows = server.DB._read().execute(
+            "SELECT game_id, COUNT(*) FROM game_rounds GROUP BY game_id;").fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    assert _wait(lambda: saved_rounds() == {first: 2, second: 2}), saved_rounds()
+    assert server.DB.get_game(first) and server.DB.get_game(second)
+
+
+def test_admin_query_params_are_clamped():
+    client = server.app.test_client()
+    assert client.get("/admin/api/games?limit=abc").status_code == 200
+    assert client.get("/admin/api/songs?min_guesses=x&limit=-5").status_code == 200
+
+
+def test_admin_games_rejects_malformed_cursor():
+    client = server.app.test_client()
+    for cursor in ("abc", "1700000000.5", "nan|g1", "|g1", "1700000000.5|"):
+        r = client.get("/admin/api/games", query_string={"cursor": cursor})
+        assert r.status_code == 400, cursor
+    assert client.get("/admin/api/games?cursor=1700000000.5|g1").status_code == 200
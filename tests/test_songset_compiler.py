@@ -0,0 +1,48 @@
+"""Compiled catalogs: what the compiler writes maps back to the same songs."""
+import io
+import json
+
+import server
+from songset_compiler import CompiledCatalog, Compiler
+
+SONGS = {
+    "A": [
+        {"title": "Yesterday", "artist": "The Beatles", "year": 1965, "spotifyUrl": "https://open.spotify.com/track/1"},
+        {"title": "Æbleskiver", "artist": "Kim Larsen", "year": 1979},
+        {"title": "Wonderwall", "artist": "Oasis", "year": 1995},
+    ],
+    "B": [
+        {"title": "Wonderwall", "artist": "Oasis", "year": 1995},
+        {"title": "Hey Ya!", "artist": "OutKast", "year": 2003},
+    ],
+}
+
+
+def _compile(tmp_path):
+    compiler = Compiler(out=io.StringIO())
+    for name, songs in SONGS.items():
+        path = tmp_path / f"songs_{name}.json"
+        path.write_text(json.dumps(songs), encoding="utf-8")
+        compiler.add_file(str(path), name)
+    out = tmp_path / "songs.catalog"
+    assert compiler.write(str(out)) == out.stat().st_size
+    return CompiledCatalog(str(out))
+
+
+def _rows(songs):
+    return [(s["title"], s["artist"], s["year"], s.get("spotifyUrl")) for s in songs]
+
+
+def test_compiled_catalog_round_trips(tmp_path):
+    compiled = _compile(tmp_path)
+    assert compiled.count == 4  # Wonderwall is stored once
+    assert list(compiled.categories) == ["A", "B"]
+    for name, songs in SONGS.items():
+        assert compiled.rows(name) == _rows(songs)
+
+
+def test_mapped_catalog_serves_the_compiled_songs(tmp_path):
+    catalog = server.SongCatalog.mapped(_compile(tmp_path))
+    for name, songs in SONGS.items():
+        served = [catalog.song(sid) for sid in catalog.ids(name)]
+        assert [(s["title"], s["artist"], s["year"], s.get("spotifyUrl")) for s in served] == _rows(songs)
@@ -354,10 +354,43 @@ function renderEnd(){
   renderHistory();
 }
 
+// Round history is fetched incrementally (`history` action) instead of riding along
+// with every state update. The state only carries history_len/history_last.
+let historyEntries = [], historyLoading = false;
+
+async function syncHistory(){
+  if(!room || !state || historyLoading) return;
+  const wantLen = state.history_len || 0;
+  const localLast = historyEntries.length ? historyEntries[historyEntries.length-1].round_number : 0;
+  if(wantLen < historyEntries.length || localLast > (state.history_last || 0)){
+    // Game was reset
+    historyEntries = [];
+  }
+  if(wantLen === historyEntries.length) return;
+  historyLoading = true;
+  try{
+    let more = true;
+    while(more){
+      const after = historyEntries.length ? historyEntries[historyEntries.length-1].round_number : 0;
+      const r = await api({action:'history', room, after});
+      historyEntries = historyEntries.concat(r.entries || []);
+      more = !!r.more && (r.entries || []).length > 0;
+    }
+  }catch(e){
+    // Retried on the next state update
+    console.warn(e);
+    return;
+  }finally{
+    historyLoading = false;
+  }
+  renderHistory();
+}
+
 function renderHistory(){
   const c = el('historyContainer');
   if(!c) return;
-  const hist = state.history || [];
+  syncHistory();
+  const hist = historyEntries;
   if(hist.length === 0){
     c.innerText = 'Ingen runder endnu.';
     return;
@@ -410,8 +443,12 @@ function renderHistory(){
 async function refreshState(){
   if(!room) return;
   try{
-    state = await api({action:'state', room});
+    // Send the last rendered version; the server answers {unchanged:true} if nothing changed.
+    const since = (state && state.room_code === room) ? state.version : undefined;
+    const r = await api({action:'state', room, since, player: player ? player.id : undefined});
     setNet(true);
+    if(r && r.unchanged) return;
+    state = r;
     render();
   }catch(e){
     setNet(false);
@@ -419,9 +456,46 @@ async function refreshState(){
   }
 }
 
+// Live updates: prefer Server-Sent Events and fall back to 1 Hz polling.
+let roomEvents = null, roomEventsLive = false;
+
+function openRoomEvents(){
+  closeRoomEvents();
+  if(!room || !window.EventSource) return;
+  const qs = player ? ('?player=' + encodeURIComponent(player.id)) : '';
+  const es = new EventSource('/api/rooms/' + encodeURIComponent(room) + '/events' + qs);
+  roomEvents = es;
+  es.onopen = () => { roomEventsLive = true; setNet(true); };
+  es.onmessage = (ev) => {
+    try{
+      state = JSON.parse(ev.data);
+      setNet(true);
+      render();
+    }catch(e){
+      console.warn(e);
+    }
+  };
+  es.addEventListener('gone', () => closeRoomEvents());
+  // EventSource reconnects by itself; poll in the meantime.
+  es.onerror = () => { roomEventsLive = false; };
+}
+
+function closeRoomEvents(){
+  if(roomEvents){
+    roomEvents.close();
+    roomEvents = null;
+  }
+  roomEventsLive = false;
+}
+
+function pollState(){
+  if(roomEventsLive) return;
+  refreshState();
+}
+
 loadVersion();
 loadCategories();
-setInterval(refreshState, 1000);
+setInterval(pollState, 1000);
 
 // EVENTS
 el('createBtn').onclick = async () => {
@@ -437,6 +511,7 @@ el('createBtn').onclick = async () => {
     el('roomCodeDisplay').innerText = 'Rumkode: ' + room;
     el('roomCodeDisplay').classList.remove('hidden');
     await refreshState();
+    openRoomEvents();
   }catch(e){
     alert('Kunne ikke oprette rum: ' + e.message);
   }
@@ -450,6 +525,7 @@ el('joinBtn').onclick = async () => {
     el('roomCodeDisplay').innerText = 'Rumkode: ' + room;
     el('roomCodeDisplay').classList.remove('hidden');
     await refreshState();
+    openRoomEvents();
   }catch(e){
     alert('Kunne ikke joine: ' + e.message);
   }
@@ -635,9 +711,11 @@ if(leaveBtn){
     }catch(e){
       // ignore
     }
+    closeRoomEvents();
     room = null;
     player = null;
     state = null;
+    historyEntries = [];
     const rc = document.getElementById('roomCodeDisplay');
     if(rc){ rc.innerText=''; rc.classList.add('hidden'); }
     leaveBtn.classList.add('hidden');